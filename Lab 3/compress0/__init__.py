@@ -0,0 +1,15 @@
+import importlib
+
+# Submodules are imported on first attribute access, so `import compress0`
+# does not pull in NumPy or PIL.
+__all__ = [
+    "batch", "benchmark", "bitstream", "cli", "color", "dct", "deadzone", "dwt", "dwt_custom",
+    "entropy", "ezw", "fastdct", "instrument", "intdct", "kernels", "lifting", "loader", "memo", "metrics",
+    "parallel", "psnr", "quality", "sequence", "ssim", "streaming", "tiles", "utils",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
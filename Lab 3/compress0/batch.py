@@ -0,0 +1,148 @@
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from . import bitstream
+from . import dwt
+from . import dwt_custom
+from . import instrument
+from .loader import load_image
+from .psnr import psnr
+from .ssim import ssim
+
+CODECS = ["dct", "dwt", "dwt_custom"]
+EXTENSIONS = (".png", ".bmp", ".jpg", ".jpeg", ".tif", ".tiff", ".gif")
+FIELDS = ["file", "height", "width", "bytes", "bpp", "psnr", "ssim", "seconds"]
+
+
+def round_trip(codec : str, image : np.array):
+    if codec == "dct":
+        data = bitstream.encode(image)
+        return data, ".dcth", bitstream.decode(data)
+    if codec == "dwt":
+        compressed = dwt.compress(image)
+        decoded = dwt.decompress(compressed)
+    else:
+        compressed = dwt_custom.compress(image)
+        decoded = dwt_custom.decompress(compressed, image.shape)
+    buffer = io.BytesIO()
+    np.save(buffer, compressed.astype(np.int16))
+    return buffer.getvalue(), ".npy", decoded
+
+def process_file(codec : str, input_path : str, output_dir : str):
+    start = time.perf_counter()
+    image = load_image(input_path)
+    data, extension, decoded = round_trip(codec, image)
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    with open(os.path.join(output_dir, name + extension), "wb") as file:
+        file.write(data)
+    return {
+        "file": input_path,
+        "height": image.shape[0],
+        "width": image.shape[1],
+        "bytes": len(data),
+        "bpp": 8 * len(data) / image.size,
+        "psnr": psnr(image, decoded),
+        "ssim": ssim(image, decoded),
+        "seconds": time.perf_counter() - start,
+    }
+
+def profiled_file(codec : str, input_path : str, output_dir : str, memory : bool = False):
+    # The stage report rides along with the row as "profile".
+    with instrument.run(input_path, memory) as measured:
+        row = process_file(codec, input_path, output_dir)
+    row["profile"] = measured.as_dict()
+    return row
+
+def process_chunk(codec : str, paths, output_dir : str, profile : bool = False, memory : bool = False):
+    if profile:
+        return [profiled_file(codec, path, output_dir, memory) for path in paths]
+    return [process_file(codec, path, output_dir) for path in paths]
+
+def write_profile(file_path : str, reports):
+    if file_path.lower().endswith(".csv"):
+        instrument.write_csv(file_path, reports)
+    else:
+        instrument.write_json(file_path, reports)
+
+def list_images(input_dir : str):
+    for entry in sorted(os.scandir(input_dir), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(EXTENSIONS):
+            yield entry.path
+
+def chunks(paths, chunksize : int):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run(input_dir : str, output_dir : str, codec : str = "dct", workers=None, chunksize : int = 4,
+        in_flight=None, results_path=None, profile_path=None, profile_memory : bool = False):
+    # At most `in_flight` chunks are submitted at a time, so neither the
+    # pending work nor the collected results grow with the directory size.
+    # With profile_path the per-image stage reports and their aggregate are
+    # written there, as CSV for a .csv path and JSON otherwise.
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or 2 * workers
+    results_path = results_path or os.path.join(output_dir, "results.csv")
+    os.makedirs(output_dir, exist_ok=True)
+
+    totals = [0, 0]
+    reports = []
+    start = time.perf_counter()
+    with open(results_path, "w", newline="") as results, ProcessPoolExecutor(workers) as pool:
+        writer = csv.DictWriter(results, fieldnames=FIELDS)
+        writer.writeheader()
+
+        def collect(done):
+            for future in done:
+                for row in future.result():
+                    if "profile" in row:
+                        reports.append(row.pop("profile"))
+                    writer.writerow(row)
+                    totals[0] += 1
+                    totals[1] += row["height"] * row["width"]
+
+        pending = set()
+        for chunk in chunks(list_images(input_dir), chunksize):
+            if len(pending) >= in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(process_chunk, codec, chunk, output_dir, profile_path is not None,
+                                    profile_memory))
+        collect(wait(pending).done)
+    elapsed = time.perf_counter() - start
+    if profile_path is not None:
+        write_profile(profile_path, reports)
+    return totals[0], totals[1], elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress every image in a directory")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--codec", choices=CODECS, default="dct")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=4)
+    parser.add_argument("--in-flight", type=int, default=None, help="maximum number of chunks submitted at once")
+    parser.add_argument("--results", default=None, help="CSV file for per-image results")
+    parser.add_argument("--profile", default=None, help="JSON or .csv file for per-stage timings")
+    parser.add_argument("--profile-memory", action="store_true", help="also record tracemalloc peaks per stage")
+    args = parser.parse_args()
+
+    images, pixels, elapsed = run(args.input_dir, args.output_dir, args.codec, args.workers,
+                                  args.chunksize, args.in_flight, args.results, args.profile, args.profile_memory)
+    if images == 0:
+        print(f"No images found in {args.input_dir}")
+        sys.exit(1)
+    print(f"{images} images in {elapsed:.2f} s: {images / elapsed:.2f} images/s, {pixels / 1e6 / elapsed:.2f} MP/s")
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from . import utils
+
+REPEAT = 5
+
+
+def cold_start(arguments, repeat : int = REPEAT):
+    # Wall time of a fresh interpreter running `python -m compress0 ...`.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "compress0"] + arguments, check=True,
+                       cwd=os.path.dirname(utils.PACKAGE_DIR), stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as work_dir:
+        cases = {
+            "interpreter only": None,
+            "--help": ["--help"],
+            "encode lena.png": ["encode", utils.package_path("input", "lena.png"), os.path.join(work_dir, "lena.dcth")],
+        }
+        for name, arguments in cases.items():
+            if arguments is None:
+                start = time.perf_counter()
+                for _ in range(REPEAT):
+                    subprocess.run([sys.executable, "-c", "pass"], check=True)
+                elapsed = (time.perf_counter() - start) / REPEAT
+            else:
+                elapsed = cold_start(arguments)
+            print(f"{name:<20s} {elapsed * 1000:8.1f} ms")
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+
+from . import dct
+from . import utils
+from .loader import load_image
+
+
+def compress_per_block(input_image : np.array):
+    input_image = input_image.copy()
+    n = input_image.shape[0] // 8
+    m = input_image.shape[1] // 8
+    for i in range(n):
+        for j in range(m):
+            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
+            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = dct.compress_block(block)
+    return input_image
+
+def decompress_per_block(input_image : np.array):
+    input_image = input_image.copy()
+    n = input_image.shape[0] // 8
+    m = input_image.shape[1] // 8
+    for i in range(n):
+        for j in range(m):
+            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
+            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = dct.decompress_block(block)
+    return input_image
+
+def best_time(function, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    FILENAME = utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+
+    loop_c, loop_compressed = best_time(compress_per_block, initial)
+    fast_c, fast_compressed = best_time(dct.compress, initial)
+    loop_d, loop_decompressed = best_time(decompress_per_block, loop_compressed)
+    fast_d, fast_decompressed = best_time(dct.decompress, fast_compressed)
+
+    print(f"DCT benchmark on {FILENAME} {initial.shape}")
+    print(f"compress   per-block {loop_c * 1000:8.2f} ms  batched {fast_c * 1000:8.2f} ms  x{loop_c / fast_c:.1f}")
+    print(f"decompress per-block {loop_d * 1000:8.2f} ms  batched {fast_d * 1000:8.2f} ms  x{loop_d / fast_d:.1f}")
+    print(f"bit exact: compress {np.array_equal(loop_compressed, fast_compressed)}, "
+          f"decompress {np.array_equal(loop_decompressed, fast_decompressed)}")
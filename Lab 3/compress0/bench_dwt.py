@@ -0,0 +1,65 @@
+import numpy as np
+
+from . import dwt
+from . import utils
+from .bench_dct import best_time
+from .loader import load_image
+
+
+def dwt_1d_per_element(array : np.array):
+    n = len(array)
+    half_n = n // 2
+    output = np.zeros(n)
+    for i in range(half_n):
+        output[i] = dwt.avg_val(array[2 * i], array[2 * i + 1])
+        output[half_n + i] = dwt.avg_dif(array[2 * i], array[2 * i + 1])
+    return output
+
+def idwt_1d_per_element(array : np.array):
+    n = len(array)
+    half_n = n // 2
+    output = np.zeros(n)
+    for i in range(half_n):
+        output[2 * i] = array[i] + array[half_n + i]
+        output[2 * i + 1] = array[i] - array[half_n + i]
+    return output
+
+def compress_per_element(input_image : np.array):
+    block = input_image.astype(np.float32)
+    (n, m) = block.shape
+    for level in range(0, dwt.LEVELS):
+        for i in range(0, n):
+            block[i, :] = dwt_1d_per_element(block[i, :])
+        for i in range(0, m):
+            block[:, i] = dwt_1d_per_element(block[:, i])
+    return np.round(block)
+
+def decompress_per_element(input_image : np.array):
+    block = input_image.astype(np.float32)
+    (n, m) = block.shape
+    for level in range(0, dwt.LEVELS):
+        for i in range(0, m):
+            block[:, i] = idwt_1d_per_element(block[:, i])
+        for i in range(0, n):
+            block[i, :] = idwt_1d_per_element(block[i, :])
+    return block
+
+
+if __name__ == "__main__":
+    FILENAME = utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+
+    loop_c, loop_compressed = best_time(compress_per_element, initial, repeat=1)
+    legacy_c, legacy_compressed = best_time(dwt.compress, initial, dwt.LEVELS, "legacy")
+    fast_c, fast_compressed = best_time(dwt.compress, initial)
+    loop_d, loop_decompressed = best_time(decompress_per_element, loop_compressed, repeat=1)
+    legacy_d, legacy_decompressed = best_time(dwt.decompress, legacy_compressed, dwt.LEVELS, "legacy")
+    fast_d, fast_decompressed = best_time(dwt.decompress, fast_compressed)
+
+    print(f"Haar DWT benchmark on {FILENAME} {initial.shape}, {dwt.LEVELS} levels")
+    print(f"compress   per-element {loop_c * 1000:8.2f} ms  legacy {legacy_c * 1000:8.2f} ms  "
+          f"pyramid {fast_c * 1000:8.2f} ms  x{loop_c / fast_c:.0f}")
+    print(f"decompress per-element {loop_d * 1000:8.2f} ms  legacy {legacy_d * 1000:8.2f} ms  "
+          f"pyramid {fast_d * 1000:8.2f} ms  x{loop_d / fast_d:.0f}")
+    print(f"legacy mode matches per-element: compress {np.array_equal(loop_compressed, legacy_compressed)}, "
+          f"decompress {np.array_equal(loop_decompressed, legacy_decompressed)}")
@@ -0,0 +1,50 @@
+import numpy as np
+
+from . import dwt_custom
+from . import utils
+from .bench_dct import best_time
+from .loader import load_image
+
+
+def compress_per_block(input_image : np.array):
+    input_image = input_image.astype(np.float32)
+    n = input_image.shape[0] // 8
+    m = input_image.shape[1] // 8
+    for i in range(n):
+        for j in range(m):
+            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
+            for k in range(0, 8):
+                block[k, :] = dwt_custom.dwt_1d(block[k, :])
+            for k in range(0, 8):
+                block[:, k] = dwt_custom.dwt_1d(block[:, k])
+            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = np.round(block)
+    return input_image
+
+def decompress_per_block(input_image : np.array):
+    input_image = input_image.astype(np.float32)
+    n = input_image.shape[0] // 8
+    m = input_image.shape[1] // 8
+    for i in range(n):
+        for j in range(m):
+            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
+            for k in range(0, 8):
+                block[:, k] = dwt_custom.idwt_1d(block[:, k])
+            for k in range(0, 8):
+                block[k, :] = dwt_custom.idwt_1d(block[k, :])
+    return input_image
+
+
+if __name__ == "__main__":
+    for FILENAME in [utils.package_path("input", "square.png"), utils.package_path("input", "lena.png")]:
+        initial = load_image(FILENAME)
+
+        loop_c, loop_compressed = best_time(compress_per_block, initial, repeat=1)
+        fast_c, fast_compressed = best_time(dwt_custom.compress, initial)
+        loop_d, loop_decompressed = best_time(decompress_per_block, loop_compressed, repeat=1)
+        fast_d, fast_decompressed = best_time(dwt_custom.decompress, fast_compressed)
+
+        print(f"8x8 Haar benchmark on {FILENAME} {initial.shape}")
+        print(f"compress   unrolled {loop_c * 1000:8.2f} ms  matrix {fast_c * 1000:8.2f} ms  x{loop_c / fast_c:.0f}")
+        print(f"decompress unrolled {loop_d * 1000:8.2f} ms  matrix {fast_d * 1000:8.2f} ms  x{loop_d / fast_d:.0f}")
+        print(f"bit exact: compress {np.array_equal(loop_compressed, fast_compressed)}, "
+              f"decompress {np.array_equal(loop_decompressed, fast_decompressed)}")
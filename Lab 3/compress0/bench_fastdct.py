@@ -0,0 +1,27 @@
+import sys
+
+import numpy as np
+
+from . import dct
+from .bench_dct import best_time
+
+BLOCK_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or BLOCK_COUNTS
+    rng = np.random.default_rng(0)
+    print("blocks     engine     forward ms  inverse ms  forward Mblk/s  inverse Mblk/s  match")
+    for count in counts:
+        blocks = rng.integers(0, 256, (count, 8, 8)).astype(np.int16)
+        repeat = 5 if count <= 100_000 else 2
+        reference = None
+        for name in dct.engines:
+            forward, quantized = best_time(dct.compress_block, blocks, dct.quantization_table, name, repeat=repeat)
+            inverse, _ = best_time(dct.decompress_block, quantized, dct.quantization_table, name, repeat=repeat)
+            if reference is None:
+                reference = quantized
+            match = np.mean(quantized == reference)
+            print(f"{count:<10d} {name:<10s} {forward * 1000:10.2f} {inverse * 1000:11.2f} "
+                  f"{count / forward / 1e6:15.2f} {count / inverse / 1e6:15.2f}  {match:.6f}")
+            del quantized
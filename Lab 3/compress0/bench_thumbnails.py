@@ -0,0 +1,67 @@
+import sys
+
+import numpy as np
+
+from . import bitstream
+from . import dct
+from . import dwt
+from . import utils
+from .bench_dct import best_time
+from .benchmark import generated_image
+from .loader import load_image
+from .psnr import psnr
+
+# Thumbnails from coefficients: a full decode followed by a box downscale
+# against the reduced-resolution decoders. PSNR compares the two thumbnails.
+
+SIZE = 2048
+REPEAT = 20
+
+
+def downscale(image : np.array, scale : int):
+    # Box average over scale x scale cells; edge cells are padded by
+    # repeating the last row and column.
+    padded = np.pad(image, [(0, -image.shape[0] % scale), (0, -image.shape[1] % scale)], mode="edge")
+    (n, m) = (padded.shape[0] // scale, padded.shape[1] // scale)
+    return padded.reshape(n, scale, m, scale).mean(axis=(1, 3))
+
+def similarity(expected : np.array, thumbnail : np.array):
+    value = psnr(expected, thumbnail)
+    return "identical" if value < 0 else f"{value:.2f}"
+
+def dct_full(coefficients : np.array, shape, scale : int):
+    return downscale(dct.decompress(coefficients, shape), scale)
+
+def dwt_full(coefficients : np.array, scale : int, table : dict):
+    return downscale(dwt.decompress(coefficients, table=table), scale)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE
+    inputs = {"lena.png": load_image(utils.package_path("input", "lena.png")), f"generated {size}": generated_image(size)}
+    table = dwt.default_steps()
+    print("image           codec  scale  full + downscale ms  scaled ms  speedup  PSNR vs downscaled")
+    for name, image in inputs.items():
+        coefficients = dct.compress(image)
+        for scale in dct.SCALES[1:]:
+            full, expected = best_time(dct_full, coefficients, image.shape, scale, repeat=REPEAT)
+            scaled, thumbnail = best_time(dct.decompress_scaled, coefficients, image.shape, scale, repeat=REPEAT)
+            print(f"{name:15s} dct    1/{scale:<4d} {1000 * full:19.2f} {1000 * scaled:10.3f} {full / scaled:8.1f}"
+                  f"  {similarity(expected, thumbnail):>9s}")
+        coefficients = dwt.compress(image, table=table)
+        for scale in (2, 4):
+            full, expected = best_time(dwt_full, coefficients, scale, table, repeat=REPEAT)
+            scaled, thumbnail = best_time(dwt.decompress_scaled, coefficients, scale, dwt.LEVELS, table,
+                                          repeat=REPEAT)
+            print(f"{name:15s} dwt    1/{scale:<4d} {1000 * full:19.2f} {1000 * scaled:10.3f} {full / scaled:8.1f}"
+                  f"  {similarity(expected, thumbnail):>9s}")
+
+    # From a .dcth stream every Huffman symbol is still parsed at any scale,
+    # which bounds the end-to-end gain.
+    data = bitstream.encode(inputs["lena.png"])
+    full, _ = best_time(bitstream.decode, data, repeat=3)
+    print(f"lena.png .dcth stream: full decode {1000 * full:.2f} ms", end="")
+    for scale in dct.SCALES[1:]:
+        scaled, _ = best_time(bitstream.decode, data, scale, repeat=3)
+        print(f", 1/{scale} {1000 * scaled:.2f} ms (x{full / scaled:.1f})", end="")
+    print()
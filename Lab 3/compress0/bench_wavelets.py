@@ -0,0 +1,29 @@
+import sys
+
+import numpy as np
+
+from . import dwt
+from . import ezw
+from . import utils
+from .bench_dct import best_time
+from .metrics import psnr
+from .loader import load_image
+
+# Speed of each pyramid wavelet and its PSNR when the embedded coder's
+# stream is cut at the same byte budget.
+BUDGETS = [2000, 4000, 8000, 16000, 32000]
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+    print(f"Wavelet comparison on {FILENAME} {initial.shape}, {ezw.LEVELS} levels")
+    print("wavelet  forward ms  inverse ms  lossless  " + "".join(f"{budget:>8d}B" for budget in BUDGETS))
+    for wavelet in dwt.wavelets:
+        forward, coefficients = best_time(dwt.compress, initial, ezw.LEVELS, dwt.MODE, None, wavelet)
+        inverse, decompressed = best_time(dwt.decompress, coefficients, ezw.LEVELS, dwt.MODE, None, wavelet)
+        lossless = np.array_equal(np.round(decompressed), initial)
+        data = ezw.encode(initial, ezw.LEVELS, wavelet)
+        scores = [psnr(initial, ezw.decode(data[:budget])) for budget in BUDGETS]
+        print(f"{wavelet:7s} {forward * 1000:11.2f} {inverse * 1000:11.2f}  {str(lossless):8s}  "
+              + "".join(f"{score:9.2f}" for score in scores))
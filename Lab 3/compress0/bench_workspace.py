@@ -0,0 +1,83 @@
+import multiprocessing
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import dct
+from . import dwt
+from . import dwt_custom
+from . import utils
+from .benchmark import generated_image
+
+# Allocation behaviour of repeated round trips with and without a
+# preallocated utils.Workspace. "transient" is the tracemalloc peak above
+# the memory held before the call, i.e. the temporaries of one round trip;
+# peak RSS comes from a fresh process per variant.
+
+SIZE = 2048
+ROUNDS = 10
+
+
+def round_trips(codec : str, image : np.array, workspace=None):
+    if codec == "dct":
+        return dct.decompress(dct.compress(image, workspace=workspace), image.shape, workspace=workspace)
+    if codec == "dwt":
+        return dwt.decompress(dwt.compress(image, workspace=workspace), workspace=workspace)
+    return dwt_custom.decompress(dwt_custom.compress(image, workspace=workspace), image.shape, workspace=workspace)
+
+def make_workspace(codec : str, shape):
+    return utils.Workspace(shape, np.float64 if codec == "dct" else np.float32)
+
+def transient(codec : str, image : np.array, workspace=None):
+    round_trips(codec, image, workspace)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    round_trips(codec, image, workspace)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - before
+
+def high_water_kib():
+    # VmHWM belongs to the address space, so unlike ru_maxrss it does not
+    # carry the parent's peak over into a spawned child.
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def peak_rss(codec : str, image : np.array, use_workspace : bool, rounds : int = ROUNDS):
+    # Runs in a fresh process.
+    workspace = make_workspace(codec, image.shape) if use_workspace else None
+    before = high_water_kib()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        round_trips(codec, image, workspace)
+    elapsed = (time.perf_counter() - start) / rounds
+    return before, high_water_kib(), elapsed
+
+def fresh_process(function, *args):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(function, *args).result()
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE
+    image = generated_image(size)
+    megabytes = image.size / 2 ** 20
+    print(f"Round trips of a {size}x{size} image ({megabytes:.0f} Mpixel), {ROUNDS} rounds")
+    print("codec       workspace  transient MiB  per pixel  peak RSS MiB (+ over start)  ms/round")
+    for codec in ("dct", "dwt", "dwt_custom"):
+        for use_workspace in (False, True):
+            workspace = make_workspace(codec, image.shape) if use_workspace else None
+            extra = transient(codec, image, workspace)
+            before, after, elapsed = fresh_process(peak_rss, codec, image, use_workspace)
+            print(f"{codec:11s} {str(use_workspace):9s} {extra / 2 ** 20:14.2f} {extra / image.size:10.2f}"
+                  f"  {after / 1024:12.1f} (+{(after - before) / 1024:6.1f})  {1000 * elapsed:10.2f}")
@@ -0,0 +1,132 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from . import dct
+from . import dwt
+from . import dwt_custom
+from . import utils
+from .psnr import psnr
+from .loader import load_image
+
+INPUT_FILES = [utils.package_path("input", name) for name in ["lena.png", "square.png", "single.png"]]
+SIZES = [256, 512, 1024, 2048, 4096, 8192]
+REPEAT = 5
+THRESHOLD = 10.0
+
+# codec -> (forward, inverse(coefficients, shape))
+CODECS = {
+    "dct": (dct.compress, lambda coefficients, shape: dct.decompress(coefficients, shape)),
+    "dwt": (dwt.compress, lambda coefficients, shape: dwt.decompress(coefficients)),
+    "dwt_custom": (dwt_custom.compress, lambda coefficients, shape: dwt_custom.decompress(coefficients, shape)),
+}
+
+
+def generated_image(size : int):
+    # Smooth gradient with texture and noise, reproducible across runs.
+    rng = np.random.default_rng(size)
+    y, x = np.mgrid[0:size, 0:size] / size
+    image = 128 + 64 * np.sin(6 * x + 3 * y) + 32 * np.cos(40 * x * y) + rng.normal(0, 8, (size, size))
+    return np.clip(np.round(image), 0, 255).astype(np.int16)
+
+def images(files=INPUT_FILES, sizes=SIZES):
+    for file_path in files:
+        yield file_path.split("/")[-1], load_image(file_path)
+    for size in sizes:
+        yield f"generated_{size}", generated_image(size)
+
+def cases(image : np.array):
+    shape = image.shape
+    for name, (forward, inverse) in CODECS.items():
+        coefficients = forward(image)
+        decoded = inverse(coefficients, shape)
+        yield f"{name}.forward", lambda forward=forward: forward(image)
+        yield f"{name}.inverse", lambda inverse=inverse, coefficients=coefficients: inverse(coefficients, shape)
+        yield f"{name}.roundtrip", lambda forward=forward, inverse=inverse: inverse(forward(image), shape)
+        if name == "dct":
+            yield "psnr", lambda: psnr(image, decoded)
+
+def measure(function, repeat : int = REPEAT):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return np.median(times), np.percentile(times, 95), peak
+
+def run(files=INPUT_FILES, sizes=SIZES, repeat : int = REPEAT, only=None):
+    results = {}
+    for image_name, image in images(files, sizes):
+        for case_name, function in cases(image):
+            if only and not any(part in case_name for part in only):
+                continue
+            median, p95, peak = measure(function, repeat)
+            key = f"{case_name}@{image_name}"
+            results[key] = {
+                "median_s": median,
+                "p95_s": p95,
+                "mp_s": image.size / 1e6 / median,
+                "peak_bytes": peak,
+            }
+            print(f"{key:<40s} median {median * 1000:10.3f} ms  p95 {p95 * 1000:10.3f} ms  "
+                  f"{image.size / 1e6 / median:9.2f} MP/s  peak {peak / 2 ** 20:9.2f} MiB", flush=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(baseline : dict, current : dict, threshold : float = THRESHOLD):
+    # Returns the cases whose median slowed down by more than threshold %.
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+        change = 100 * (result["median_s"] / reference["median_s"] - 1)
+        if change > threshold:
+            regressions.append((key, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compress0 codecs")
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown in percent")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", nargs="*", default=None, help="run cases whose name contains any of these")
+    args = parser.parse_args(argv)
+
+    report = run(INPUT_FILES, args.sizes, args.repeat, args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.threshold)
+        for key, change in regressions:
+            print(f"REGRESSION {key}: {change:+.1f}% (threshold {args.threshold}%)")
+        if regressions:
+            return 1
+        print(f"No case slowed down by more than {args.threshold}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
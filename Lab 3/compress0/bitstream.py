@@ -0,0 +1,93 @@
+import struct
+import sys
+import time
+
+import numpy as np
+
+from . import dct
+from . import entropy
+from . import utils
+from .psnr import psnr
+from .loader import load_image
+
+MAGIC = b"DCTH"
+VERSION = 1
+# magic, version, height, width, Huffman tables length, payload length
+HEADER = struct.Struct(">4sBIIHI")
+
+
+def encode_coefficients(coefficients : np.array, shape, table : np.array = dct.quantization_table) -> bytes:
+    tables, payload = entropy.encode(coefficients)
+    header = HEADER.pack(MAGIC, VERSION, shape[0], shape[1], len(tables), len(payload))
+    return header + np.asarray(table).astype('>u2').tobytes() + tables + payload
+
+def decode_coefficients(data : bytes, corner : int = 8):
+    # corner < 8 keeps only that low-frequency corner of each block.
+    magic, version, height, width, tables_length, payload_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a DCT bitstream")
+    if version != VERSION:
+        raise ValueError(f"Unsupported bitstream version {version}")
+    offset = HEADER.size
+    table = np.frombuffer(data, dtype='>u2', count=64, offset=offset).reshape(8, 8).astype(np.int64)
+    offset += 128
+    tables = data[offset:offset + tables_length]
+    offset += tables_length
+    payload = data[offset:offset + payload_length]
+    padded_shape = (height + (-height % 8), width + (-width % 8))
+    coefficients = entropy.decode(tables, payload, padded_shape, corner)
+    return coefficients, (height, width), table
+
+def encode(image : np.array, table : np.array = dct.quantization_table) -> bytes:
+    return encode_coefficients(dct.compress(image, table), image.shape, table)
+
+def decode(data : bytes, scale : int = 1):
+    # scale 2, 4 or 8 gives a reduced-resolution preview. The Huffman codes
+    # are sequential, so every symbol is still parsed, but only the
+    # coefficients of the 8 / scale corner are extracted and stored.
+    if scale not in dct.SCALES:
+        raise ValueError(f"Unsupported scale {scale}, expected one of {dct.SCALES}")
+    coefficients, shape, table = decode_coefficients(data, 8 // scale)
+    return dct.decompress_scaled(coefficients, shape, scale, table)
+
+def write(file_path : str, image : np.array, table : np.array = dct.quantization_table):
+    data = encode(image, table)
+    with open(file_path, "wb") as file:
+        file.write(data)
+    return len(data)
+
+def read(file_path : str, scale : int = 1):
+    with open(file_path, "rb") as file:
+        return decode(file.read(), scale)
+
+
+if __name__ == "__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    output_path = sys.argv[2] if len(sys.argv) > 2 else utils.package_path("dct", input_path.split("/")[-1].split(".")[0] + ".dcth")
+    initial = load_image(input_path)
+    megabytes = initial.size / 1e6
+
+    start = time.perf_counter()
+    coefficients = dct.compress(initial)
+    transformed = time.perf_counter()
+    data = encode_coefficients(coefficients, initial.shape)
+    encoded = time.perf_counter()
+    with open(output_path, "wb") as file:
+        file.write(data)
+
+    with open(output_path, "rb") as file:
+        data = file.read()
+    start_decode = time.perf_counter()
+    decoded_coefficients, shape, table = decode_coefficients(data)
+    entropy_decoded = time.perf_counter()
+    decoded = dct.decompress(decoded_coefficients, shape, table)
+    finished = time.perf_counter()
+
+    print(f"Bitstream for {input_path} {initial.shape} -> {output_path}")
+    print(f"size: {len(data)} bytes, {8 * len(data) / initial.size:.3f} bits per pixel")
+    print(f"entropy encode: {megabytes / (encoded - transformed):8.2f} MB/s  "
+          f"decode: {megabytes / (entropy_decoded - start_decode):8.2f} MB/s")
+    print(f"full encode:    {megabytes / (encoded - start):8.2f} MB/s  "
+          f"decode: {megabytes / (finished - start_decode):8.2f} MB/s")
+    print(f"lossless entropy stage: {np.array_equal(coefficients, decoded_coefficients)}")
+    print(f"PSNR: {psnr(initial, decoded)}")
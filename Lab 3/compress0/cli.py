@@ -0,0 +1,106 @@
+import argparse
+import sys
+
+# Codec modules (and with them NumPy and PIL) are imported inside the
+# command handlers, so `--help` and argument errors return immediately.
+
+CODECS = ["dct", "dwt", "dwt_custom"]
+
+
+def encode(args):
+    import numpy as np
+    from . import bitstream, dwt, dwt_custom, quality
+    from .loader import load_image
+
+    image = load_image(args.input)
+    if args.codec == "dct":
+        table = quality.scaled_table(args.quality)
+        size = bitstream.write(args.output, image, table)
+    else:
+        codec = dwt if args.codec == "dwt" else dwt_custom
+        with open(args.output, "wb") as file:
+            np.savez(file, codec=args.codec, shape=image.shape, coefficients=codec.compress(image).astype(np.int16))
+            size = file.tell()
+    print(f"{args.input} -> {args.output}: {size} bytes, {8 * size / image.size:.3f} bits per pixel")
+    return 0
+
+def decode(args):
+    import numpy as np
+    from . import bitstream, dwt, dwt_custom
+    from .loader import to_image
+
+    with open(args.input, "rb") as file:
+        data = file.read()
+    if data.startswith(bitstream.MAGIC):
+        image = bitstream.decode(data, args.scale)
+    else:
+        with np.load(args.input) as archive:
+            codec = str(archive["codec"])
+            shape = tuple(archive["shape"])
+            coefficients = archive["coefficients"]
+        if codec == "dwt" and args.scale > 1 << dwt.LEVELS:
+            print(f"{args.input}: dwt decodes at most at 1/{1 << dwt.LEVELS} scale", file=sys.stderr)
+            return 1
+        if codec == "dwt":
+            image = dwt.decompress_scaled(coefficients, args.scale)
+        elif args.scale == 1:
+            image = dwt_custom.decompress(coefficients, shape)
+        else:
+            print(f"{args.input}: scaled decoding is not supported for {codec}", file=sys.stderr)
+            return 1
+    to_image(image, args.output)
+    print(f"{args.input} -> {args.output}: {image.shape[1]}x{image.shape[0]}")
+    return 0
+
+def psnr(args):
+    from .loader import load_image
+    from .metrics import score
+
+    result = score(load_image(args.first), load_image(args.second), structural=True)
+    print(f"PSNR: {result['psnr']}  MSE: {result['mse']}  MAE: {result['mae']}  max error: {result['max_error']}")
+    print(f"SSIM: {result['ssim']}  MS-SSIM: {result['ms_ssim']}")
+    return 0
+
+def bench(args):
+    from . import benchmark
+    return benchmark.main(args.arguments)
+
+def parser():
+    root = argparse.ArgumentParser(prog="compress0", description="Image compression codecs")
+    commands = root.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("encode", help="compress an image")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.add_argument("--codec", choices=CODECS, default="dct")
+    command.add_argument("--quality", type=int, default=50, help="JPEG quality factor for the dct codec")
+    command.set_defaults(handler=encode)
+
+    command = commands.add_parser("decode", help="decompress a file written by encode")
+    command.add_argument("input")
+    command.add_argument("output")
+    command.add_argument("--scale", type=int, choices=[1, 2, 4, 8], default=1,
+                         help="decode at 1/scale resolution (dct: up to 8, dwt: up to 4)")
+    command.set_defaults(handler=decode)
+
+    command = commands.add_parser("psnr", help="compare two images (PSNR, SSIM, MS-SSIM)")
+    command.add_argument("first")
+    command.add_argument("second")
+    command.set_defaults(handler=psnr)
+
+    command = commands.add_parser("bench", help="run the benchmark suite (see bench --help)", add_help=False)
+    command.add_argument("arguments", nargs=argparse.REMAINDER)
+    command.set_defaults(handler=bench)
+    return root
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # bench forwards everything after it, options included, to benchmark.
+    if argv[:1] == ["bench"]:
+        return bench(argparse.Namespace(arguments=argv[1:]))
+    args = parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import sys
+
+import numpy as np
+
+from . import dct
+from . import utils
+from .metrics import psnr
+from .loader import load_color_image
+
+# JPEG Annex K chrominance table; luminance uses dct.quantization_table.
+chroma_quantization_table = np.array([
+    [17, 18, 24, 47, 99, 99, 99, 99],
+    [18, 21, 26, 66, 99, 99, 99, 99],
+    [24, 26, 56, 99, 99, 99, 99, 99],
+    [47, 66, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99],
+    [99, 99, 99, 99, 99, 99, 99, 99]
+])
+
+# JFIF full-range conversion, rows give Y, Cb, Cr from R, G, B.
+rgb_to_ycbcr_matrix = np.array([
+    [0.299, 0.587, 0.114],
+    [-0.168736, -0.331264, 0.5],
+    [0.5, -0.418688, -0.081312]
+])
+ycbcr_to_rgb_matrix = np.linalg.inv(rgb_to_ycbcr_matrix)
+ycbcr_offset = np.array([0, 128, 128])
+
+# (vertical, horizontal) chroma decimation factors.
+SUBSAMPLING = {"4:4:4": (1, 1), "4:2:2": (1, 2), "4:2:0": (2, 2)}
+CHANNELS = ["Y", "Cb", "Cr"]
+# Side of the generated RGB image the demo uses when no file is given.
+SIZE = 64
+
+
+def rgb_to_ycbcr(image : np.array):
+    ycbcr = image @ rgb_to_ycbcr_matrix.T + ycbcr_offset
+    return np.round(ycbcr).astype(np.int16)
+
+def ycbcr_to_rgb(image : np.array):
+    rgb = (image - ycbcr_offset) @ ycbcr_to_rgb_matrix.T
+    return np.clip(np.round(rgb), 0, 255).astype(np.int16)
+
+def subsample(plane : np.array, factors):
+    (fy, fx) = factors
+    if (fy, fx) == (1, 1):
+        return plane
+    (n, m) = plane.shape
+    padded = np.pad(plane, ((0, -n % fy), (0, -m % fx)), mode='edge').astype(np.float64)
+    (n, m) = padded.shape
+    averaged = padded.reshape(n // fy, fy, m // fx, fx).mean(axis=(1, 3))
+    return np.round(averaged).astype(np.int16)
+
+def upsample(plane : np.array, factors, shape):
+    (fy, fx) = factors
+    return plane.repeat(fy, axis=0).repeat(fx, axis=1)[:shape[0], :shape[1]]
+
+def plane_shapes(shape, subsampling : str = "4:2:0"):
+    (fy, fx) = SUBSAMPLING[subsampling]
+    chroma = (-(-shape[0] // fy), -(-shape[1] // fx))
+    return [tuple(shape[:2]), chroma, chroma]
+
+def plane_tables():
+    return [dct.quantization_table, chroma_quantization_table, chroma_quantization_table]
+
+def compress(image : np.array, subsampling : str = "4:2:0"):
+    ycbcr = rgb_to_ycbcr(image)
+    factors = SUBSAMPLING[subsampling]
+    planes = [ycbcr[..., 0], subsample(ycbcr[..., 1], factors), subsample(ycbcr[..., 2], factors)]
+    return [dct.compress(plane, table) for plane, table in zip(planes, plane_tables())]
+
+def decompress(planes, shape, subsampling : str = "4:2:0"):
+    factors = SUBSAMPLING[subsampling]
+    shapes = plane_shapes(shape, subsampling)
+    decoded = [dct.decompress(plane, plane_shape, table)
+               for plane, plane_shape, table in zip(planes, shapes, plane_tables())]
+    ycbcr = np.stack([decoded[0], upsample(decoded[1], factors, shape), upsample(decoded[2], factors, shape)], axis=-1)
+    return ycbcr_to_rgb(ycbcr)
+
+def channel_psnr(original : np.array, decoded : np.array):
+    result = {name: psnr(original[..., k], decoded[..., k]) for k, name in enumerate("RGB")}
+    original_ycbcr = rgb_to_ycbcr(original)
+    decoded_ycbcr = rgb_to_ycbcr(decoded)
+    result.update({name: psnr(original_ycbcr[..., k], decoded_ycbcr[..., k]) for k, name in enumerate(CHANNELS)})
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        name, initial = sys.argv[1], load_color_image(sys.argv[1])
+    else:
+        # The bundled inputs are grayscale; the generated image flipped and
+        # transposed per channel gives real chroma for the subsampling to drop.
+        from .benchmark import generated_image
+        plane = generated_image(SIZE)
+        name, initial = f"generated {SIZE}", np.stack([plane, plane.T, plane[::-1]], axis=-1)
+    print(f"Color DCT transform of {name} {initial.shape}")
+    for subsampling in SUBSAMPLING:
+        compressed = compress(initial, subsampling)
+        decompressed = decompress(compressed, initial.shape, subsampling)
+        coefficients = sum(plane.size for plane in compressed)
+        report = ", ".join(f"{name} {value:.2f}" for name, value in channel_psnr(initial, decompressed).items())
+        print(f"{subsampling}: {coefficients} coefficients, PSNR {report}")
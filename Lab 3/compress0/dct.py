@@ -1,8 +1,14 @@
+from collections import namedtuple
+
 import numpy as np
 
-import utils
-from psnr import psnr
-from loader import load_image, to_image
+from . import fastdct
+from . import instrument
+from . import kernels
+from . import memo
+from . import utils
+from .psnr import psnr
+from .loader import load_image, to_image
 
 
 quantization_table = np.array([
@@ -17,14 +23,10 @@ quantization_table = np.array([
 ])
 
 
-def dct_matrix() -> np.array:
-    t = np.zeros((8, 8))
-    for p in range(0, 8):
-        for q in range(0, 8):
-            if p == 0:
-                t[p][q] = 1 / np.sqrt(8)
-            else:
-                t[p][q] = 0.5 * np.cos(np.pi * (2 * q + 1) * p / 16)
+def dct_matrix(size : int = 8) -> np.array:
+    (p, q) = np.mgrid[0:size, 0:size]
+    t = np.sqrt(2 / size) * np.cos(np.pi * (2 * q + 1) * p / (2 * size))
+    t[0, :] = 1 / np.sqrt(size)
     return t
 
 t_matrix = dct_matrix()
@@ -34,51 +36,194 @@ def dct(shifted_image : np.array):
 def idct(shifted_image : np.array):
     return t_matrix.T @ shifted_image @ t_matrix
 
-def compress_block(block : np.array):
+# A transform engine computes scale * DCT; its scale is folded into the
+# quantization table (divided out on encode, multiplied in on decode).
+Engine = namedtuple("Engine", ["forward", "inverse", "forward_scale", "inverse_scale"])
+
+def matrix_engine(kernel) -> Engine:
+    # Engine from a kernels.block_backends kernel.
+    return Engine(lambda blocks: kernel(t_matrix, blocks), lambda blocks: kernel(t_matrix.T, blocks),
+                  np.ones((8, 8)), np.ones((8, 8)))
+
+engines = {
+    "matrix": Engine(dct, idct, np.ones((8, 8)), np.ones((8, 8))),
+    "butterfly": Engine(fastdct.aan_dct, fastdct.aan_idct, fastdct.forward_scale, fastdct.inverse_scale),
+}
+for name, kernel in kernels.block_backends.items():
+    if name != "matmul":
+        engines[name] = matrix_engine(kernel)
+# engine="auto" is the fastest engine for the block count whose quantized
+# coefficients and decoded pixels match "matrix" exactly on the check
+# blocks, chosen by kernels.choose. It is the default only with
+# COMPRESS0_AUTOTUNE=1; "matrix" keeps the output host independent.
+AUTO = "auto"
+ENGINE = AUTO if kernels.AUTOTUNE else "matrix"
+
+def engine_outputs(engine : Engine, pixels : np.array, coefficients : np.array):
+    # What compress_block and decompress_block store: int16 coefficients
+    # and truncated int16 pixels, where a tiny float error can flip a value.
+    quantized = np.round(engine.forward(pixels - 128) / (quantization_table * engine.forward_scale))
+    decoded = np.clip(engine.inverse(coefficients * (quantization_table * engine.inverse_scale)) + 128, 0, 255)
+    return quantized.astype(np.int16), decoded.astype(np.int16)
+
+def engine_sample(count : int, rng):
+    # Random blocks, with every other block flat (pixels) or DC only
+    # (coefficients), where the matrix path gives exact integers.
+    pixels = rng.integers(0, 256, (count, 8, 8)).astype(np.int16)
+    pixels[::2] = pixels[::2, :1, :1]
+    coefficients = np.where(rng.random((count, 8, 8)) < 0.8, 0, rng.integers(-8, 9, (count, 8, 8)))
+    coefficients[:, 0, 0] = rng.integers(-64, 64, count)
+    coefficients[::2, 1:] = 0
+    coefficients[::2, 0, 1:] = 0
+    return pixels, coefficients.astype(np.int16)
+
+kernels.register_family("dct", kernels.Family("matrix", engines, engine_sample,
+                                              lambda engine, args: engine_outputs(engine, *args)))
+
+def register_engine(name : str, engine : Engine):
+    engines[name] = engine
+
+def engine_name(name=None, count : int = 1) -> str:
+    name = name or ENGINE
+    return kernels.choose("dct", count) if name == AUTO else name
+
+def get_engine(name=None, count : int = 1) -> Engine:
+    return engines[engine_name(name, count)]
+
+def compress_block(block : np.array, table : np.array = quantization_table, engine=None):
+    engine = get_engine(engine, block.size // 64)
     shifted = block - 128
-    after_dct = dct(shifted)
-    quantized = np.round(after_dct / quantization_table)
-    return np.round(quantized)
-def compress(input_image : np.array):
-    input_image = input_image.copy()
-    n = input_image.shape[0] // 8
-    for i in range(n):
-        for j in range(n):
-            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
-            new_block = compress_block(block)
-            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = new_block
-    return input_image
-
-def decompress_block(block : np.array):
-    dequantized = block.astype(np.int16) * quantization_table
-    before_dct = idct(dequantized)
+    with instrument.stage("dct.transform"):
+        after_dct = engine.forward(shifted)
+    with instrument.stage("dct.quantize"):
+        quantized = np.round(after_dct / (table * engine.forward_scale))
+    return quantized
+def cache_context(name : str, table : np.array, engine=None, count : int = 1):
+    # Keyed on the engine that actually runs, never on "auto".
+    return (name, np.asarray(table).tobytes(), engine_name(engine, count))
+
+def compress_into(workspace : utils.Workspace, input_image : np.array, table : np.array = quantization_table):
+    # Matrix-engine compress that works entirely in the workspace buffers.
+    workspace.check(input_image.shape)
+    padded = utils.pad_to_blocks(input_image, out=workspace.pixels)
+    blocks = workspace.blocks
+    np.subtract(utils.to_blocks(padded), 128, out=blocks)
+    np.matmul(t_matrix, blocks, out=workspace.scratch)
+    np.matmul(workspace.scratch, t_matrix.T, out=blocks)
+    np.divide(blocks, table, out=blocks)
+    np.rint(blocks, out=blocks)
+    np.copyto(utils.to_blocks(workspace.coefficients), blocks, casting='unsafe')
+    return workspace.coefficients
+
+def decompress_into(workspace : utils.Workspace, input_image : np.array, shape=None, table : np.array = quantization_table):
+    workspace.check(input_image.shape)
+    blocks = workspace.blocks
+    np.multiply(utils.to_blocks(input_image), table, out=blocks)
+    np.matmul(t_matrix.T, blocks, out=workspace.scratch)
+    np.matmul(workspace.scratch, t_matrix, out=blocks)
+    np.add(blocks, 128, out=blocks)
+    np.clip(blocks, 0, 255, out=blocks)
+    np.copyto(utils.to_blocks(workspace.pixels), blocks, casting='unsafe')
+    return utils.crop(workspace.pixels, shape)
+
+def in_place(engine, cache):
+    # The in-place path is the matrix transform whatever ENGINE says.
+    if cache is not None or engine not in (None, "matrix"):
+        raise ValueError("A workspace needs the matrix engine and no block cache")
+
+@instrument.timed("dct.compress")
+def compress(input_image : np.array, table : np.array = quantization_table, engine=None, cache=None, workspace=None):
+    # With a memo.BlockCache repeated blocks are transformed only once; with
+    # a utils.Workspace no full-image temporaries are allocated.
+    if workspace is not None:
+        in_place(engine, cache)
+        return compress_into(workspace, input_image, table)
+    blocks = utils.to_blocks(utils.pad_to_blocks(input_image))
+    engine = engine_name(engine, blocks.size // 64)
+    if cache is None:
+        quantized = compress_block(blocks, table, engine)
+    else:
+        quantized = memo.memoize(cache, lambda b: compress_block(b, table, engine), blocks,
+                                 cache_context("dct.compress", table, engine))
+    return utils.from_blocks(quantized).astype(np.int16)
+
+def decompress_block(block : np.array, table : np.array = quantization_table, engine=None):
+    engine = get_engine(engine, block.size // 64)
+    with instrument.stage("dct.dequantize"):
+        dequantized = block.astype(np.int16) * (table * engine.inverse_scale)
+    with instrument.stage("dct.inverse_transform"):
+        before_dct = engine.inverse(dequantized)
     return np.clip(before_dct + 128, 0, 255)
 
-def decompress(input_image : np.array):
-    input_image = input_image.copy()
-    n = input_image.shape[0] // 8
-    for i in range(n):
-        for j in range(n):
-            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
-            new_block = decompress_block(block)
-            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = new_block
-    return input_image
-print("DCT transform")
-WORK_DIR = "dct/"
-FILENAME = "lena.png"
-INPUT_DIR = "input/"
-split = FILENAME.split(".", 2)
-short_name = split[0]
-extension = "." + split[1]
-initial = load_image(INPUT_DIR + FILENAME)
-
-compressed = compress(initial)
-compressed_portrait = utils.scale_matrix(compressed)
-to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
-decompressed = decompress(compressed)
-to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
-
-_psnr = psnr(initial, decompressed)
-
-print(f"PSNR: {_psnr}")
+@instrument.timed("dct.decompress")
+def decompress(input_image : np.array, shape=None, table : np.array = quantization_table, engine=None, cache=None,
+               workspace=None):
+    if workspace is not None:
+        in_place(engine, cache)
+        return decompress_into(workspace, input_image, shape, table)
+    blocks = utils.to_blocks(input_image)
+    engine = engine_name(engine, blocks.size // 64)
+    if cache is None:
+        decompressed = decompress_block(blocks, table, engine)
+    else:
+        decompressed = memo.memoize(cache, lambda b: decompress_block(b, table, engine), blocks,
+                                    cache_context("dct.decompress", table, engine))
+    return utils.crop(utils.from_blocks(decompressed).astype(np.int16), shape)
+
+# Denominators of the reduced-resolution decodes.
+SCALES = (1, 2, 4, 8)
+
+def scaled_shape(shape, scale : int):
+    if shape is None:
+        return None
+    return (-(-shape[0] // scale), -(-shape[1] // scale))
+
+@instrument.timed("dct.decompress_scaled")
+def decompress_scaled(input_image : np.array, shape=None, scale : int = 8, table : np.array = quantization_table):
+    # Decode at 1/scale resolution: each block becomes an (8 / scale)-pixel
+    # square from its low-frequency corner, 1/8 being the DC alone. The
+    # reduced inverse DCT carries a sqrt(size / 8) gain per axis, which turns
+    # the corner's DC into the block mean; float32 is plenty for previews.
+    if scale not in SCALES:
+        raise ValueError(f"Unsupported scale {scale}, expected one of {SCALES}")
+    if scale == 1:
+        return decompress(input_image, shape, table)
+    size = 8 // scale
+    (rows, columns) = (input_image.shape[0] // 8, input_image.shape[1] // 8)
+    if size == 1:
+        pixels = input_image[::8, ::8] * (table[0, 0] / 8) + 128
+    else:
+        t = (dct_matrix(size) * np.sqrt(size / 8)).astype(np.float32)
+        # Horizontal pass per coefficient row u, with that row of the
+        # quantization table folded in: diag(table[u]) @ t.
+        horizontal = (table[:size, :size, None] * t).astype(np.float32)
+        corners = input_image.reshape(rows, 8, columns, 8)[:, :size, :, :size].astype(np.float32)
+        # Laid out as (rows, size, columns * size) the vertical pass is one
+        # product per block row, and its result is already the image.
+        passed = (corners @ horizontal).reshape(rows, size, columns * size)
+        pixels = np.matmul(t.T, passed, out=corners.reshape(rows, size, columns * size))
+        pixels = pixels.reshape(rows * size, columns * size)
+        pixels += 128
+    pixels = np.clip(pixels, 0, 255, out=np.empty(pixels.shape, dtype=np.int16), casting='unsafe')
+    return utils.crop(pixels, scaled_shape(shape, scale))
+
+
+if __name__ == "__main__":
+    print("DCT transform")
+    WORK_DIR = utils.package_path("dct/")
+    FILENAME = "lena.png"
+    INPUT_DIR = utils.package_path("input/")
+    split = FILENAME.split(".", 2)
+    short_name = split[0]
+    extension = "." + split[1]
+    initial = load_image(INPUT_DIR + FILENAME)
+
+    compressed = compress(initial)
+    compressed_portrait = utils.scale_matrix(compressed)
+    to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
+    decompressed = decompress(compressed, initial.shape)
+    to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
+
+    _psnr = psnr(initial, decompressed)
 
+    print(f"PSNR: {_psnr}")
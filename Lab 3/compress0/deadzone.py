@@ -0,0 +1,55 @@
+import sys
+
+import numpy as np
+
+# Uniform scalar quantizer with a dead zone: everything below one step in
+# magnitude maps to zero, and non-zero indices reconstruct to the middle
+# of their interval. `steps` is a scalar or an array broadcastable to the
+# coefficients, so per-subband step sizes cost one whole-array operation.
+
+
+def quantize(coefficients : np.array, steps, out : np.array = None, scratch : np.array = None):
+    # out (which may be coefficients itself) and scratch are optional
+    # buffers of the coefficients' shape for the in-place pipeline.
+    if out is None:
+        return np.sign(coefficients) * np.floor(np.abs(coefficients) / steps)
+    magnitude = np.abs(coefficients, out=scratch)
+    np.divide(magnitude, steps, out=magnitude)
+    np.floor(magnitude, out=magnitude)
+    np.sign(coefficients, out=out)
+    return np.multiply(out, magnitude, out=out)
+
+def dequantize(quantized : np.array, steps, out : np.array = None, scratch : np.array = None):
+    if out is None:
+        return np.sign(quantized) * (np.abs(quantized) + 0.5) * steps
+    magnitude = np.abs(quantized, out=scratch)
+    magnitude += 0.5
+    magnitude *= steps
+    np.sign(quantized, out=out)
+    return np.multiply(out, magnitude, out=out)
+
+
+if __name__ == "__main__":
+    # dwt and dwt_custom import this module, so the report imports them here.
+    from . import dwt, dwt_custom, utils
+    from .metrics import psnr
+    from .loader import load_image
+
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    STEP = 16
+    initial = load_image(FILENAME)
+    print(f"Dead-zone quantization of {FILENAME} {initial.shape}, base step {STEP}")
+
+    table = dwt.default_steps(dwt.LEVELS, STEP)
+    quantized = dwt.compress(initial, table=table)
+    decompressed = dwt.decompress(quantized, table=table)
+    print(f"dwt: PSNR {psnr(initial, decompressed):.2f}, zeros {np.mean(quantized == 0):.3f}")
+    for name, fraction in dwt.sparsity(quantized).items():
+        print(f"  {name:<6s} step {table[name]:6.2f}  zeros {fraction:.3f}")
+
+    table = dwt_custom.default_steps(STEP)
+    quantized = dwt_custom.compress(initial, table)
+    decompressed = dwt_custom.decompress(quantized, initial.shape, table)
+    print(f"dwt_custom: PSNR {psnr(initial, decompressed):.2f}, zeros {np.mean(quantized == 0):.3f}")
+    for name, fraction in dwt_custom.sparsity(quantized).items():
+        print(f"  {name:<6s} zeros {fraction:.3f}")
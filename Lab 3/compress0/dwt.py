@@ -1,8 +1,14 @@
+from functools import partial
+
 import numpy as np
 
-import utils
-from psnr import psnr
-from loader import load_image, to_image
+from . import deadzone
+from . import instrument
+from . import kernels
+from . import lifting
+from . import utils
+from .psnr import psnr
+from .loader import load_image, to_image
 
 
 def avg_val(i1, i2):
@@ -14,83 +20,308 @@ def avg_dif(i1, i2):
 
 
 def dwt_1d(array: np.array):
-    n = len(array)
+    # Legacy single-level transform along the last axis, output layout
+    # [approximation | detail]; works on one row or a whole stack of them.
+    n = array.shape[-1]
     half_n = n // 2
-    output = np.zeros(n)
+    output = np.zeros_like(array)
+    even = array[..., 0:2 * half_n:2]
+    odd = array[..., 1:2 * half_n:2]
+    output[..., :half_n] = avg_val(even, odd)  # Approximation
+    output[..., half_n:2 * half_n] = avg_dif(even, odd)  # Detail
+    return output
 
-    for i in range(half_n):
-        output[i] = avg_val(array[2 * i], array[2 * i + 1])  # Approximation
-        output[half_n + i] = avg_dif(array[2 * i], array[2 * i + 1])  # Detail
 
+def idwt_1d(array: np.array):
+    n = array.shape[-1]
+    half_n = n // 2
+    output = np.zeros_like(array)
+    output[..., 0:2 * half_n:2] = array[..., :half_n] + array[..., half_n:2 * half_n]
+    output[..., 1:2 * half_n:2] = array[..., :half_n] - array[..., half_n:2 * half_n]
     return output
 
 
-def idwt_1d(array: np.array):
-    n = len(array)
+def lift(block: np.array, axis: int):
+    # In-place Haar lifting along one axis: d = (even - odd) / 2, s = odd + d,
+    # which gives the same average/difference pair as avg_val/avg_dif.
+    # For odd lengths the trailing sample is carried into the approximation.
+    view = np.moveaxis(block, axis, -1)
+    n = view.shape[-1]
     half_n = n // 2
-    output = np.zeros(n)
+    even = view[..., 0:2 * half_n:2]
+    odd = view[..., 1:2 * half_n:2]
+    detail = avg_dif(even, odd)
+    approximation = odd + detail
+    if n % 2:
+        view[..., half_n] = view[..., n - 1]
+    view[..., :half_n] = approximation
+    view[..., n - half_n:] = detail
 
-    for i in range(half_n):
-        output[2 * i] = array[i] + array[half_n + i]
-        output[2 * i + 1] = array[i] - array[half_n + i]
 
-    return output
+def unlift(block: np.array, axis: int):
+    view = np.moveaxis(block, axis, -1)
+    n = view.shape[-1]
+    half_n = n // 2
+    approximation = view[..., :half_n]
+    detail = view[..., n - half_n:]
+    even = approximation + detail
+    odd = approximation - detail
+    if n % 2:
+        view[..., n - 1] = view[..., half_n]
+    view[..., 0:2 * half_n:2] = even
+    view[..., 1:2 * half_n:2] = odd
+
+
+def separable(forward, band : np.array):
+    forward(band, 1)
+    forward(band, 0)
+
+
+def inverse_separable(inverse, band : np.array):
+    inverse(band, 0)
+    inverse(band, 1)
+
+
+def haar_polyphase(band : np.array):
+    # One Haar level from the four 2x2 polyphase components in a single
+    # pass, instead of a row pass and a column pass; odd sizes fall back.
+    (n, m) = band.shape
+    if n % 2 or m % 2:
+        return separable(lift, band)
+    (a, b, c, d) = (band[0::2, 0::2], band[0::2, 1::2], band[1::2, 0::2], band[1::2, 1::2])
+    (s1, s2, d1, d2) = (a + b, c + d, a - b, c - d)
+    (h, w) = (n // 2, m // 2)
+    band[:h, :w] = (s1 + s2) / 4
+    band[h:, :w] = (s1 - s2) / 4
+    band[:h, w:] = (d1 + d2) / 4
+    band[h:, w:] = (d1 - d2) / 4
+
+
+def inverse_haar_polyphase(band : np.array):
+    (n, m) = band.shape
+    if n % 2 or m % 2:
+        return inverse_separable(unlift, band)
+    (h, w) = (n // 2, m // 2)
+    (ll, lh, hl, hh) = (band[:h, :w], band[h:, :w], band[:h, w:], band[h:, w:])
+    (s1, s2, d1, d2) = (ll + lh, ll - lh, hl + hh, hl - hh)
+    band[0::2, 0::2] = s1 + d1
+    band[0::2, 1::2] = s1 - d1
+    band[1::2, 0::2] = s2 + d2
+    band[1::2, 1::2] = s2 - d2
+
+
+def band_shape(shape, level: int):
+    (n, m) = shape
+    for _ in range(level):
+        n = (n + 1) // 2
+        m = (m + 1) // 2
+    return n, m
+
 
 LEVELS = 2
-def dwt(block : np.array):
-    (n, m) = block.shape
-    for level in range(0, LEVELS):
-       for i in range(0, n):
-           block[i, :] = dwt_1d(block[i, :])
-       for i in range(0, m):
-           block[:, i] = dwt_1d(block[:, i])
+# "pyramid" recurses into the LL band only, "legacy" re-transforms the whole
+# array at every level and reproduces the results of the original script.
+MODE = "pyramid"
+# Pyramid-mode filters as (analysis, synthesis) steps along one axis; the
+# CDF pair use symmetric extension, cdf53 is integer and reversible.
+WAVELET = "haar"
+wavelets = {
+    "haar": (lift, unlift),
+    "cdf53": (partial(lifting.lift_with, lifting.cdf53_forward), partial(lifting.unlift_with, lifting.cdf53_inverse)),
+    "cdf97": (partial(lifting.lift_with, lifting.cdf97_forward), partial(lifting.unlift_with, lifting.cdf97_inverse)),
+}
+
+
+# One pyramid level on a 2-D band as (analysis, synthesis); the Haar level
+# is a kernels family, so the fastest correct backend is picked per host.
+haar_levels = {
+    "separable": (partial(separable, lift), partial(inverse_separable, unlift)),
+    "polyphase": (haar_polyphase, inverse_haar_polyphase),
+}
+
+
+def haar_sample(count : int, rng):
+    side = 8 * int(np.ceil(np.sqrt(count)))
+    return (rng.integers(0, 256, (side, side)).astype(np.float32),)
+
+
+def haar_call(backend, args):
+    band = args[0].copy()
+    backend[0](band)
+    analysed = band.copy()
+    backend[1](band)
+    return analysed, band
+
+
+kernels.register_family("haar", kernels.Family("separable", haar_levels, haar_sample, haar_call))
+
+
+def filters(mode : str, wavelet : str):
+    if mode == "legacy" and wavelet != "haar":
+        raise ValueError("The legacy layout only supports the Haar wavelet")
+    return wavelets[wavelet]
+
+
+def level_filters(wavelet : str, size : int):
+    if wavelet == "haar":
+        return haar_levels[kernels.default("haar", size // 64)]
+    (forward, inverse) = wavelets[wavelet]
+    return partial(separable, forward), partial(inverse_separable, inverse)
+
+
+def dwt(block : np.array, levels : int = LEVELS, mode : str = MODE, wavelet : str = WAVELET):
+    filters(mode, wavelet)
+    if mode == "legacy":
+        for level in range(0, levels):
+            block[:, :] = dwt_1d(block)
+            block[:, :] = dwt_1d(block.T).T
+        return block
+    (analysis, _) = level_filters(wavelet, block.size)
+    for level in range(0, levels):
+        (n, m) = band_shape(block.shape, level)
+        analysis(block[:n, :m])
     return block
 
 
-def inverse_dwt(block : np.array):
-    (n, m) = block.shape
-    for level in range(0, LEVELS):
-        for i in range(0, m):
-            block[:, i] = idwt_1d(block[:, i])
-        for i in range(0, n):
-            block[i, :] = idwt_1d(block[i, :])
+def inverse_dwt(block : np.array, levels : int = LEVELS, mode : str = MODE, wavelet : str = WAVELET):
+    filters(mode, wavelet)
+    if mode == "legacy":
+        for level in range(0, levels):
+            block[:, :] = idwt_1d(block.T).T
+            block[:, :] = idwt_1d(block)
+        return block
+    (_, synthesis) = level_filters(wavelet, block.size)
+    for level in reversed(range(0, levels)):
+        (n, m) = band_shape(block.shape, level)
+        synthesis(block[:n, :m])
     return block
 
-def compress_block(block : np.array):
-    after_wavelet = dwt(block)
-    quantized = after_wavelet
-    return np.round(quantized)
+def subbands(shape, levels : int = LEVELS):
+    # Pyramid layout; the first letter is the horizontal filter, the second
+    # the vertical one, so HL holds vertical edges (high along rows).
+    bands = {}
+    for level in range(1, levels + 1):
+        (n, m) = band_shape(shape, level - 1)
+        (a, b) = band_shape(shape, level)
+        bands[f"HL{level}"] = (slice(0, a), slice(b, m))
+        bands[f"LH{level}"] = (slice(a, n), slice(0, b))
+        bands[f"HH{level}"] = (slice(a, n), slice(b, m))
+    (a, b) = band_shape(shape, levels)
+    bands[f"LL{levels}"] = (slice(0, a), slice(0, b))
+    return bands
+
+def default_steps(levels : int = LEVELS, step : float = 16):
+    # avg/dif Haar shrinks level-k bands by 2**k compared with an orthonormal
+    # transform, so equal steps in orthonormal terms become step / 2**k.
+    table = {}
+    for name in subbands((1 << levels, 1 << levels), levels):
+        table[name] = step / 2 ** int(name[2:])
+    return table
+
+def step_map(shape, levels : int = LEVELS, table : dict = None, level : int = 0):
+    # With `level` only the band_shape(shape, level) corner, which holds the
+    # LL band and the subbands of the coarser levels.
+    steps = np.empty(band_shape(shape, level), dtype=np.float32)
+    for name, region in subbands(shape, levels).items():
+        if name[:2] == "LL" or int(name[2:]) > level:
+            steps[region] = table[name]
+    return steps
+
+def sparsity(quantized : np.array, levels : int = LEVELS):
+    return {name: float(np.mean(quantized[region] == 0)) for name, region in subbands(quantized.shape, levels).items()}
+
+def compress_block(block : np.array, levels : int = LEVELS, mode : str = MODE, steps=None, wavelet : str = WAVELET):
+    with instrument.stage("dwt.transform"):
+        after_wavelet = dwt(block, levels, mode, wavelet)
+    with instrument.stage("dwt.quantize"):
+        quantized = after_wavelet if steps is None else deadzone.quantize(after_wavelet, steps)
+        quantized = np.round(quantized)
+    return quantized
+
+def compress_into(workspace : utils.Workspace, input_image : np.array, levels : int = LEVELS,
+                  steps=None, wavelet : str = WAVELET):
+    # Pyramid lifting on a float32 workspace window, quantized in place.
+    workspace.check(input_image.shape)
+    block = workspace.plane_view(workspace.plane, input_image.shape)
+    np.copyto(block, input_image, casting='unsafe')
+    dwt(block, levels, "pyramid", wavelet)
+    if steps is not None:
+        deadzone.quantize(block, steps, out=block, scratch=workspace.plane_view(workspace.scratch, block.shape))
+    return np.rint(block, out=block)
+
+def decompress_into(workspace : utils.Workspace, input_image : np.array, levels : int = LEVELS,
+                    steps=None, wavelet : str = WAVELET):
+    workspace.check(input_image.shape)
+    block = workspace.plane_view(workspace.plane, input_image.shape)
+    np.copyto(block, input_image, casting='unsafe')
+    if steps is not None:
+        deadzone.dequantize(block, steps, out=block, scratch=workspace.plane_view(workspace.scratch, block.shape))
+    return inverse_dwt(block, levels, "pyramid", wavelet)
 
-def compress(input_image : np.array):
+@instrument.timed("dwt.compress")
+def compress(input_image : np.array, levels : int = LEVELS, mode : str = MODE, table : dict = None,
+             wavelet : str = WAVELET, workspace=None):
+    # With a step table the pyramid subbands are dead-zone quantized,
+    # without one the coefficients are only rounded.
+    if table is not None and mode == "legacy":
+        raise ValueError("Subband quantization needs the pyramid layout")
+    steps = None if table is None else step_map(input_image.shape, levels, table)
+    if workspace is not None and mode == "pyramid":
+        return compress_into(workspace, input_image, levels, steps, wavelet)
     input_image = input_image.astype(np.float32)
-    input_image = compress_block(input_image)
+    input_image = compress_block(input_image, levels, mode, steps, wavelet)
     return input_image
 
-def decompress_block(block : np.array):
-    before_wavelet = inverse_dwt(block)
+def decompress_block(block : np.array, levels : int = LEVELS, mode : str = MODE, steps=None, wavelet : str = WAVELET):
+    if steps is not None:
+        with instrument.stage("dwt.dequantize"):
+            block = deadzone.dequantize(block, steps)
+    with instrument.stage("dwt.inverse_transform"):
+        before_wavelet = inverse_dwt(block, levels, mode, wavelet)
     return before_wavelet
 
-def decompress(input_image : np.array):
+@instrument.timed("dwt.decompress")
+def decompress(input_image : np.array, levels : int = LEVELS, mode : str = MODE, table : dict = None,
+               wavelet : str = WAVELET, workspace=None):
+    if table is not None and mode == "legacy":
+        raise ValueError("Subband quantization needs the pyramid layout")
+    steps = None if table is None else step_map(input_image.shape, levels, table)
+    if workspace is not None and mode == "pyramid":
+        return decompress_into(workspace, input_image, levels, steps, wavelet)
     input_image = input_image.astype(np.float32)
-    input_image = decompress_block(input_image)
+    input_image = decompress_block(input_image, levels, mode, steps, wavelet)
     return input_image
 
-print("Wavelet transform")
-WORK_DIR = "dwt/"
-FILENAME = "lena.png"
-INPUT_DIR = "input/"
-split = FILENAME.split(".", 2)
-short_name = split[0]
-extension = "." + split[1]
-initial = load_image(INPUT_DIR + FILENAME)
+@instrument.timed("dwt.decompress_scaled")
+def decompress_scaled(input_image : np.array, scale : int = 2, levels : int = LEVELS, table : dict = None,
+                      wavelet : str = WAVELET):
+    # Decode pyramid coefficients at 1/scale resolution: only the corner up
+    # to the LL band of level log2(scale) is read, and the inverse stops there.
+    level = scale.bit_length() - 1
+    if scale != 1 << level or level > levels:
+        raise ValueError(f"Scale must be a power of two up to {1 << levels}")
+    (n, m) = band_shape(input_image.shape, level)
+    block = input_image[:n, :m].astype(np.float32)
+    if table is not None:
+        block = deadzone.dequantize(block, step_map(input_image.shape, levels, table, level))
+    return inverse_dwt(block, levels - level, "pyramid", wavelet)
 
-compressed = compress(initial)
-compressed_portrait = utils.scale_matrix(compressed)
-to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
-decompressed = decompress(compressed)
-to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
+if __name__ == "__main__":
+    print("Wavelet transform")
+    WORK_DIR = utils.package_path("dwt/")
+    FILENAME = "lena.png"
+    INPUT_DIR = utils.package_path("input/")
+    split = FILENAME.split(".", 2)
+    short_name = split[0]
+    extension = "." + split[1]
+    initial = load_image(INPUT_DIR + FILENAME)
 
-_psnr = psnr(initial, decompressed)
+    compressed = compress(initial)
+    compressed_portrait = utils.scale_matrix(compressed)
+    to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
+    decompressed = decompress(compressed)
+    to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
 
-print(f"PSNR: {_psnr}")
+    _psnr = psnr(initial, decompressed)
 
+    print(f"PSNR: {_psnr}")
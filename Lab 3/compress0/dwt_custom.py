@@ -1,8 +1,12 @@
 import numpy as np
 
-import utils
-from psnr import psnr
-from loader import load_image, to_image
+from . import deadzone
+from . import instrument
+from . import kernels
+from . import memo
+from . import utils
+from .psnr import psnr
+from .loader import load_image, to_image
 
 
 def avg_val(i1, i2):
@@ -64,66 +68,159 @@ def idwt_1d(array : np.array):
     return output
 
 
-def dwt(block : np.array):
-   for i in range(0, 8):
-       block[i, :] = dwt_1d(block[i, :])
-   for i in range(0, 8):
-       block[:, i] = dwt_1d(block[:, i])
-   return block
-
-
-def inverse_dwt(block : np.array):
-    for i in range(0, 8):
-        block[:, i] = idwt_1d(block[:, i])
-    for i in range(0, 8):
-        block[i, :] = idwt_1d(block[i, :])
-    return block
-
-def compress_block(block : np.array):
-    after_wavelet = dwt(block)
-    quantized = after_wavelet
-    return np.round(quantized)
-
-def compress(input_image : np.array):
-    input_image = input_image.astype(np.float32)
-    n = input_image.shape[0] // 8
-    for i in range(n):
-        for j in range(n):
-            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
-            new_block = compress_block(block)
-            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = new_block
-    return input_image
-
-def decompress_block(block : np.array):
-    before_wavelet = inverse_dwt(block)
+def haar_matrix() -> np.array:
+    # Columns are the unrolled transform applied to the unit vectors, so
+    # haar @ x == dwt_1d(x) for any 8-element x.
+    return np.array([dwt_1d(column) for column in np.eye(8)]).T
+
+def inverse_haar_matrix() -> np.array:
+    return np.array([idwt_1d(column) for column in np.eye(8)]).T
+
+h_matrix = haar_matrix().astype(np.float32)
+h_inverse = inverse_haar_matrix().astype(np.float32)
+
+def dwt(block : np.array, backend : str = None):
+    return kernels.block_transform(h_matrix, block, backend or kernels.default("dwt_custom", block.size // 64))
+
+
+def inverse_dwt(block : np.array, backend : str = None):
+    return kernels.block_transform(h_inverse, block, backend or kernels.default("dwt_custom", block.size // 64))
+
+# Subband of each coefficient index of the 3-level 8-point transform.
+band_labels = ["L3", "H3", "H2", "H2", "H1", "H1", "H1", "H1"]
+# Gain of each index relative to an orthonormal Haar: 2**-0.5 per level.
+band_scale = np.array([2 ** -1.5, 2 ** -1.5, 2 ** -1, 2 ** -1] + [2 ** -0.5] * 4)
+
+def default_steps(step : float = 16) -> np.array:
+    # 8x8 step table, used like the DCT quantization table; float32 like the
+    # coefficients, so quantizing does not promote them to float64.
+    return (step * np.outer(band_scale, band_scale)).astype(np.float32)
+
+def backend_outputs(backend, pixels : np.array, coefficients : np.array, indices : np.array):
+    # What compress_block and decompress_block produce with and without a
+    # step table, as integers: rounded and dead-zone coefficients, and
+    # pixels after the int16 truncation.
+    table = default_steps()
+    transformed = backend(h_matrix, pixels)
+    quantized = (np.round(transformed), np.round(deadzone.quantize(transformed, table)))
+    decoded = (backend(h_inverse, coefficients), backend(h_inverse, deadzone.dequantize(indices, table)))
+    return (tuple(q.astype(np.int16) for q in quantized)
+            + tuple(np.clip(d, 0, 255).astype(np.int16) for d in decoded))
+
+def backend_sample(count : int, rng):
+    # Integer pixels, every other block flat, put many coefficients exactly
+    # on a rounding or dead-zone boundary; their exact transforms decode to
+    # integer pixels, so any float error in a backend flips a value.
+    pixels = rng.integers(0, 256, (count, 8, 8)).astype(np.float32)
+    pixels[::2] = pixels[::2, :1, :1]
+    coefficients = haar_matrix() @ pixels @ haar_matrix().T
+    indices = np.round(deadzone.quantize(coefficients, default_steps()))
+    return pixels, coefficients.astype(np.float32), indices.astype(np.float32)
+
+# The block backends, checked on the codec's outputs rather than with the
+# float tolerance of the "block" family.
+kernels.register_family("dwt_custom", kernels.Family("matmul", kernels.block_backends, backend_sample,
+                                                     lambda backend, args: backend_outputs(backend, *args)))
+
+def subbands():
+    # Name is horizontal band then vertical band, e.g. "H1L3".
+    bands = {}
+    for i in range(8):
+        for j in range(8):
+            name = band_labels[j] + band_labels[i]
+            bands.setdefault(name, np.zeros((8, 8), dtype=bool))[i, j] = True
+    return bands
+
+def sparsity(quantized : np.array):
+    blocks = utils.to_blocks(quantized)
+    return {name: float(np.mean(blocks[..., mask] == 0)) for name, mask in subbands().items()}
+
+def compress_block(block : np.array, table : np.array = None, backend : str = None):
+    with instrument.stage("dwt_custom.transform"):
+        after_wavelet = dwt(block, backend)
+    with instrument.stage("dwt_custom.quantize"):
+        quantized = after_wavelet if table is None else deadzone.quantize(after_wavelet, table)
+        quantized = np.round(quantized)
+    return quantized
+
+def cache_context(name : str, table : np.array = None, backend : str = None):
+    return (name, None if table is None else np.asarray(table).tobytes(), backend or kernels.default("dwt_custom"))
+
+def compress_into(workspace : utils.Workspace, input_image : np.array, table : np.array = None):
+    # float32 workspace; the returned plane is the workspace's own buffer.
+    workspace.check(input_image.shape)
+    blocks = workspace.blocks
+    padded = utils.pad_to_blocks(input_image, out=workspace.pixels)
+    np.copyto(blocks, utils.to_blocks(padded), casting='unsafe')
+    np.matmul(h_matrix, blocks, out=workspace.scratch)
+    np.matmul(workspace.scratch, h_matrix.T, out=blocks)
+    if table is not None:
+        deadzone.quantize(blocks, table, out=blocks, scratch=workspace.scratch)
+    np.rint(blocks, out=blocks)
+    np.copyto(utils.to_blocks(workspace.plane), blocks)
+    return workspace.plane
+
+def decompress_into(workspace : utils.Workspace, input_image : np.array, shape=None, table : np.array = None):
+    workspace.check(input_image.shape)
+    blocks = workspace.blocks
+    np.copyto(blocks, utils.to_blocks(input_image), casting='unsafe')
+    if table is not None:
+        deadzone.dequantize(blocks, table, out=blocks, scratch=workspace.scratch)
+    np.matmul(h_inverse, blocks, out=workspace.scratch)
+    np.matmul(workspace.scratch, h_inverse.T, out=blocks)
+    np.copyto(utils.to_blocks(workspace.plane), blocks)
+    return utils.crop(workspace.plane, shape)
+
+@instrument.timed("dwt_custom.compress")
+def compress(input_image : np.array, table : np.array = None, cache=None, workspace=None):
+    if workspace is not None:
+        return compress_into(workspace, input_image, table)
+    input_image = utils.pad_to_blocks(input_image).astype(np.float32)
+    blocks = utils.to_blocks(input_image)
+    if cache is not None:
+        # One backend for the whole call, so the cache key names what ran.
+        backend = kernels.default("dwt_custom", blocks.size // 64)
+        return utils.from_blocks(memo.memoize(cache, lambda b: compress_block(b, table, backend), blocks,
+                                              cache_context("dwt_custom.compress", table, backend)))
+    return utils.from_blocks(compress_block(blocks, table))
+
+def decompress_block(block : np.array, table : np.array = None, backend : str = None):
+    if table is not None:
+        with instrument.stage("dwt_custom.dequantize"):
+            block = deadzone.dequantize(block, table)
+    with instrument.stage("dwt_custom.inverse_transform"):
+        before_wavelet = inverse_dwt(block, backend)
     return before_wavelet
 
-def decompress(input_image : np.array):
+@instrument.timed("dwt_custom.decompress")
+def decompress(input_image : np.array, shape=None, table : np.array = None, cache=None, workspace=None):
+    if workspace is not None:
+        return decompress_into(workspace, input_image, shape, table)
     input_image = input_image.astype(np.float32)
-    n = input_image.shape[0] // 8
-    for i in range(n):
-        for j in range(n):
-            block = input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
-            new_block = decompress_block(block)
-            input_image[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8] = new_block
-    return input_image
-
-print("Custom Wavelet transform")
-WORK_DIR = "dwt_custom/"
-FILENAME = "lena.png"
-INPUT_DIR = "input/"
-split = FILENAME.split(".", 2)
-short_name = split[0]
-extension = "." + split[1]
-initial = load_image(INPUT_DIR + FILENAME)
-
-compressed = compress(initial)
-compressed_portrait = utils.scale_matrix(compressed)
-to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
-decompressed = decompress(compressed)
-to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
-
-_psnr = psnr(initial, decompressed)
-
-print(f"PSNR: {_psnr}")
-
+    blocks = utils.to_blocks(input_image)
+    if cache is not None:
+        backend = kernels.default("dwt_custom", blocks.size // 64)
+        decompressed = memo.memoize(cache, lambda b: decompress_block(b, table, backend), blocks,
+                                    cache_context("dwt_custom.decompress", table, backend))
+        return utils.crop(utils.from_blocks(decompressed), shape)
+    return utils.crop(utils.from_blocks(decompress_block(blocks, table)), shape)
+
+if __name__ == "__main__":
+    print("Custom Wavelet transform")
+    WORK_DIR = utils.package_path("dwt_custom/")
+    FILENAME = "lena.png"
+    INPUT_DIR = utils.package_path("input/")
+    split = FILENAME.split(".", 2)
+    short_name = split[0]
+    extension = "." + split[1]
+    initial = load_image(INPUT_DIR + FILENAME)
+
+    compressed = compress(initial)
+    compressed_portrait = utils.scale_matrix(compressed)
+    to_image(compressed_portrait, WORK_DIR + short_name + "_c" + extension)
+    decompressed = decompress(compressed, initial.shape)
+    to_image(decompressed, WORK_DIR + short_name + "_d" + extension)
+
+    _psnr = psnr(initial, decompressed)
+
+    print(f"PSNR: {_psnr}")
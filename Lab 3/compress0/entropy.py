@@ -0,0 +1,277 @@
+import heapq
+
+import numpy as np
+
+from . import instrument
+from . import utils
+
+MAX_CODE_LENGTH = 16
+ZRL = 0xF0
+EOB = 0x00
+
+
+def zigzag_order(size : int = utils.BLOCK_SIZE) -> np.array:
+    cells = [(i, j) for i in range(size) for j in range(size)]
+    cells.sort(key=lambda c: (c[0] + c[1], c[1] if (c[0] + c[1]) % 2 == 0 else c[0]))
+    return np.array([i * size + j for i, j in cells])
+
+ZIGZAG = zigzag_order()
+UNZIGZAG = np.argsort(ZIGZAG)
+
+
+def category(values : np.array):
+    # Number of bits needed for |value|, 0 for zero (JPEG "SSSS").
+    return np.frexp(np.abs(values).astype(np.float64))[1].astype(np.int64)
+
+def amplitude(values : np.array, sizes : np.array):
+    values = values.astype(np.int64)
+    return np.where(values < 0, values + (1 << sizes) - 1, values)
+
+
+def code_lengths(frequencies : np.array):
+    symbols = np.nonzero(frequencies)[0]
+    lengths = np.zeros(len(frequencies), dtype=np.int64)
+    if len(symbols) == 1:
+        lengths[symbols[0]] = 1
+        return lengths
+    heap = [(int(frequencies[s]), int(s), [int(s)]) for s in symbols]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        f1, k1, s1 = heapq.heappop(heap)
+        f2, k2, s2 = heapq.heappop(heap)
+        for s in s1 + s2:
+            lengths[s] += 1
+        heapq.heappush(heap, (f1 + f2, min(k1, k2), s1 + s2))
+    return limit_lengths(lengths, frequencies)
+
+def limit_lengths(lengths : np.array, frequencies : np.array):
+    # JPEG Annex K.3 adjustment: move symbols out of lengths above
+    # MAX_CODE_LENGTH while keeping the code prefix-free.
+    bits = np.bincount(lengths[lengths > 0], minlength=MAX_CODE_LENGTH + 1)
+    if len(bits) <= MAX_CODE_LENGTH + 1:
+        return lengths
+    bits = list(bits)
+    i = len(bits) - 1
+    while i > MAX_CODE_LENGTH:
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+        i -= 1
+    order = sorted(np.nonzero(frequencies)[0], key=lambda s: -frequencies[s])
+    limited = np.zeros_like(lengths)
+    k = 0
+    for length in range(1, MAX_CODE_LENGTH + 1):
+        for _ in range(bits[length]):
+            limited[order[k]] = length
+            k += 1
+    return limited
+
+def canonical_codes(lengths : np.array):
+    codes = np.zeros(len(lengths), dtype=np.int64)
+    code = 0
+    previous = 0
+    for symbol in sorted(np.nonzero(lengths)[0], key=lambda s: (lengths[s], s)):
+        code <<= int(lengths[symbol]) - previous
+        codes[symbol] = code
+        previous = int(lengths[symbol])
+        code += 1
+    return codes
+
+def table_spec(lengths : np.array):
+    # DHT-style description: symbol count per length 1..16, then symbols.
+    symbols = sorted(np.nonzero(lengths)[0], key=lambda s: (lengths[s], s))
+    counts = np.bincount(lengths[symbols], minlength=MAX_CODE_LENGTH + 1)[1:]
+    return bytes(counts.astype(np.uint8)) + bytes(np.array(symbols, dtype=np.uint8))
+
+def lengths_from_spec(spec : bytes):
+    counts = spec[:MAX_CODE_LENGTH]
+    lengths = np.zeros(256, dtype=np.int64)
+    k = MAX_CODE_LENGTH
+    for length, count in enumerate(counts, start=1):
+        for symbol in spec[k:k + count]:
+            lengths[symbol] = length
+        k += count
+    return lengths, k
+
+def lookup_table(lengths : np.array):
+    # Indexed by the next MAX_CODE_LENGTH bits of the stream; each entry is
+    # (symbol << 5) | code length.
+    codes = canonical_codes(lengths)
+    table = np.zeros(1 << MAX_CODE_LENGTH, dtype=np.int64)
+    for symbol in np.nonzero(lengths)[0]:
+        shift = MAX_CODE_LENGTH - int(lengths[symbol])
+        start = int(codes[symbol]) << shift
+        table[start:start + (1 << shift)] = (int(symbol) << 5) | int(lengths[symbol])
+    return table.tolist()
+
+
+def symbols(coefficients : np.array):
+    # Flattens the quantized plane into the ordered event stream of the
+    # baseline JPEG scan: table id, Huffman symbol, extra bits and their count.
+    zz = utils.to_blocks(coefficients).reshape(-1, 64)[:, ZIGZAG].astype(np.int64)
+    n = zz.shape[0]
+    keys_per_block = 64 * 4 + 1
+    blocks = np.arange(n)
+
+    dc_diff = np.diff(zz[:, 0], prepend=0)
+    dc_size = category(dc_diff)
+
+    ac = zz[:, 1:]
+    b_idx, p_idx = np.nonzero(ac)
+    values = ac[b_idx, p_idx]
+    first = np.ones(len(b_idx), dtype=bool)
+    first[1:] = b_idx[1:] != b_idx[:-1]
+    previous = np.empty_like(p_idx)
+    previous[1:] = p_idx[:-1]
+    previous[first] = -1
+    run = p_idx - previous - 1
+    ac_size = category(values)
+    if ac_size.size and ac_size.max() > 15:
+        raise ValueError("Coefficient magnitude does not fit the AC symbol alphabet")
+
+    zrl_count = run >> 4
+    zrl_owner = np.repeat(np.arange(len(b_idx)), zrl_count)
+    zrl_rank = np.arange(len(zrl_owner)) - np.repeat(np.cumsum(zrl_count) - zrl_count, zrl_count)
+
+    last = np.ones(len(b_idx), dtype=bool)
+    last[:-1] = b_idx[1:] != b_idx[:-1]
+    last_position = np.full(n, -1)
+    last_position[b_idx[last]] = p_idx[last]
+    eob_blocks = blocks[last_position != 62]
+
+    keys = np.concatenate([
+        blocks * keys_per_block,
+        b_idx[zrl_owner] * keys_per_block + (p_idx[zrl_owner] + 1) * 4 + zrl_rank,
+        b_idx * keys_per_block + (p_idx + 1) * 4 + 3,
+        eob_blocks * keys_per_block + 64 * 4,
+    ])
+    table = np.concatenate([
+        np.zeros(n, dtype=np.int64),
+        np.ones(len(zrl_owner) + len(b_idx) + len(eob_blocks), dtype=np.int64),
+    ])
+    symbol = np.concatenate([
+        dc_size,
+        np.full(len(zrl_owner), ZRL),
+        ((run & 15) << 4) | ac_size,
+        np.full(len(eob_blocks), EOB),
+    ])
+    extra_length = np.concatenate([
+        dc_size,
+        np.zeros(len(zrl_owner), dtype=np.int64),
+        ac_size,
+        np.zeros(len(eob_blocks), dtype=np.int64),
+    ])
+    extra = np.concatenate([
+        amplitude(dc_diff, dc_size),
+        np.zeros(len(zrl_owner), dtype=np.int64),
+        amplitude(values, ac_size),
+        np.zeros(len(eob_blocks), dtype=np.int64),
+    ])
+    order = np.argsort(keys, kind='stable')
+    return table[order], symbol[order], extra[order], extra_length[order]
+
+def pack_bits(values : np.array, lengths : np.array):
+    # Codes are at most 32 bits long, so each one lands in at most two
+    # big-endian 32-bit words. Contributions to a word never overlap, which
+    # lets a weighted bincount stand in for a bitwise OR.
+    total = int(lengths.sum())
+    if total == 0:
+        return b"", 0
+    offsets = np.cumsum(lengths) - lengths
+    word = offsets >> 5
+    end = (offsets & 31) + lengths
+    fits = end <= 32
+    high = np.where(fits, values << np.maximum(32 - end, 0), values >> np.maximum(end - 32, 0))
+    spill = np.maximum(end - 32, 0)
+    low = (values & ((1 << spill) - 1)) << (32 - spill)
+    n_words = (total + 31) // 32 + 1
+    words = np.bincount(word, weights=high, minlength=n_words)
+    words += np.bincount(word[~fits] + 1, weights=low[~fits], minlength=n_words)
+    data = words.astype(np.uint32).astype('>u4').tobytes()
+    return data[:(total + 7) // 8], total
+
+@instrument.timed("entropy.encode")
+def encode(coefficients : np.array):
+    table, symbol, extra, extra_length = symbols(coefficients)
+    lengths = [code_lengths(np.bincount(symbol[table == t], minlength=256)) for t in (0, 1)]
+    codes = [canonical_codes(l) for l in lengths]
+    code = np.where(table == 0, codes[0][symbol], codes[1][symbol])
+    code_length = np.where(table == 0, lengths[0][symbol], lengths[1][symbol])
+    payload, _ = pack_bits((code << extra_length) | extra, code_length + extra_length)
+    return table_spec(lengths[0]) + table_spec(lengths[1]), payload
+
+def corner_mask(corner : int):
+    # Zigzag positions inside the top-left corner x corner coefficients.
+    rows, columns = np.divmod(ZIGZAG, 8)
+    return ((rows < corner) & (columns < corner)).tolist() + [False] * 16
+
+@instrument.timed("entropy.decode")
+def decode(tables : bytes, payload : bytes, shape, corner : int = 8):
+    # With corner < 8 only the low-frequency corner is kept; the other AC
+    # codes are still parsed, but their amplitudes are skipped unread.
+    dc_lengths, k = lengths_from_spec(tables)
+    ac_lengths, _ = lengths_from_spec(tables[k:])
+    dc_lut = lookup_table(dc_lengths)
+    ac_lut = lookup_table(ac_lengths)
+
+    padded = np.frombuffer(payload + bytes(8), dtype=np.uint8).astype(np.int64)
+    window = np.zeros(len(payload) + 1, dtype=np.int64)
+    for k in range(6):
+        window += padded[k:k + len(window)] << (40 - 8 * k)
+    window = window.tolist()
+
+    n_blocks = (shape[0] // 8) * (shape[1] // 8)
+    positions = []
+    values = []
+    pos = 0
+    dc = 0
+    peek_mask = (1 << MAX_CODE_LENGTH) - 1
+    keep = corner_mask(corner)
+    for b in range(n_blocks):
+        base = b * 64
+        entry = dc_lut[(window[pos >> 3] >> (32 - (pos & 7))) & peek_mask]
+        pos += entry & 31
+        size = entry >> 5
+        if size:
+            bits = (window[pos >> 3] >> (48 - (pos & 7) - size)) & ((1 << size) - 1)
+            pos += size
+            if bits < 1 << (size - 1):
+                bits -= (1 << size) - 1
+            dc += bits
+        if dc:
+            positions.append(base)
+            values.append(dc)
+        k = 1
+        while k < 64:
+            entry = ac_lut[(window[pos >> 3] >> (32 - (pos & 7))) & peek_mask]
+            pos += entry & 31
+            symbol = entry >> 5
+            if symbol == EOB:
+                break
+            if symbol == ZRL:
+                k += 16
+                continue
+            k += symbol >> 4
+            size = symbol & 15
+            if not keep[k]:
+                pos += size
+                k += 1
+                continue
+            bits = (window[pos >> 3] >> (48 - (pos & 7) - size)) & ((1 << size) - 1)
+            pos += size
+            if bits < 1 << (size - 1):
+                bits -= (1 << size) - 1
+            positions.append(base + k)
+            values.append(bits)
+            k += 1
+
+    zz = np.zeros(n_blocks * 64, dtype=np.int16)
+    zz[positions] = values
+    blocks = zz.reshape(n_blocks, 64)[:, UNZIGZAG]
+    blocks = blocks.reshape(shape[0] // 8, shape[1] // 8, 8, 8)
+    return utils.from_blocks(blocks)
@@ -0,0 +1,180 @@
+import struct
+import sys
+import time
+
+import numpy as np
+
+from . import dwt
+from . import utils
+from .metrics import psnr
+from .loader import load_image
+
+# Embedded bit-plane coder for the multi-level wavelet pyramid, in the spirit
+# of EZW/SPIHT: significance is coded top-down through a quadtree of
+# magnitude maxima (a zero node stands for a whole insignificant subtree),
+# followed by sign bits for new coefficients and one refinement bit for
+# each coefficient that was already significant. Planes go from the most
+# significant down, so every prefix of the payload is a coarser version of
+# the same image and the decoder accepts truncated streams. The quadtree has
+# a grid of roots: each axis is padded to a multiple of 2**depth, with depth
+# set by the shorter side, so memory follows the image area.
+
+MAGIC = b"EZWH"
+VERSION = 3
+LEVELS = 5
+# Wavelet ids as stored in the header.
+WAVELETS = list(dwt.wavelets)
+# Extra gain of one high-pass pass over the avg/dif Haar detail; the
+# integer 5/3 keeps its details unhalved to stay reversible.
+DETAIL_GAIN = {"haar": 1, "cdf53": 2, "cdf97": 1}
+# magic, version, height, width, wavelet levels, wavelet id, top bit plane
+HEADER = struct.Struct(">4sBIIBBb")
+
+
+def subband_weights(shape, levels : int, wavelet : str = dwt.WAVELET):
+    # avg/dif Haar scales each level's detail bands by 1/2 relative to an
+    # orthonormal transform; weighting by 2**level makes bit planes
+    # comparable in MSE terms across subbands. Weights stay >= 1 so the
+    # full stream remains lossless on integer coefficients.
+    weights = np.ones(shape)
+    for name, region in dwt.subbands(shape, levels).items():
+        gain = DETAIL_GAIN[wavelet] ** name[:2].count("H")
+        weights[region] = max(1, 2 ** int(name[2:]) // gain)
+    return weights
+
+def tree_shape(shape):
+    # Padded shape and quadtree depth.
+    depth = max(0, int(np.ceil(np.log2(max(1, min(shape))))))
+    step = 1 << depth
+    return (-(-shape[0] // step) * step, -(-shape[1] // step) * step), depth
+
+def expand(parent : np.array):
+    return parent.repeat(2, axis=0).repeat(2, axis=1)
+
+def magnitude_pyramid(magnitudes : np.array, depth : int):
+    pyramid = [magnitudes]
+    for _ in range(depth):
+        (n, m) = (pyramid[-1].shape[0] // 2, pyramid[-1].shape[1] // 2)
+        pyramid.append(pyramid[-1].reshape(n, 2, m, 2).max(axis=(1, 3)))
+    return pyramid
+
+
+def encode_coefficients(coefficients : np.array, shape, levels : int = LEVELS, wavelet : str = dwt.WAVELET) -> bytes:
+    weighted = np.round(coefficients * subband_weights(coefficients.shape, levels, wavelet)).astype(np.int64)
+    (padded_shape, depth) = tree_shape(weighted.shape)
+    padded = np.zeros(padded_shape, dtype=np.int64)
+    padded[:weighted.shape[0], :weighted.shape[1]] = weighted
+    magnitudes = np.abs(padded)
+    pyramid = magnitude_pyramid(magnitudes, depth)
+    top = int(magnitudes.max()).bit_length() - 1
+
+    known = [np.zeros(level.shape, dtype=bool) for level in pyramid]
+    groups = []
+    for p in range(top, -1, -1):
+        threshold = 1 << p
+        refined = known[0].copy()
+        for l in range(len(pyramid) - 1, -1, -1):
+            candidates = ~known[l]
+            if l + 1 < len(pyramid):
+                candidates &= expand(known[l + 1])
+            flags = pyramid[l][candidates] >= threshold
+            groups.append(flags)
+            known[l][candidates] = flags
+            if l == 0:
+                groups.append(padded[candidates][flags] < 0)
+        groups.append(((magnitudes[refined] >> p) & 1).astype(bool))
+
+    bits = np.concatenate(groups) if groups else np.zeros(0, dtype=bool)
+    header = HEADER.pack(MAGIC, VERSION, shape[0], shape[1], levels, WAVELETS.index(wavelet), top)
+    return header + np.packbits(bits).tobytes()
+
+def decode_coefficients(data : bytes):
+    magic, version, height, width, levels, wavelet, top = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an embedded wavelet bitstream")
+    if version != VERSION:
+        raise ValueError(f"Unsupported bitstream version {version}")
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=HEADER.size)).astype(bool)
+    position = 0
+
+    ((n, m), depth) = tree_shape((height, width))
+    depth += 1
+    known = [np.zeros((n >> l, m >> l), dtype=bool) for l in range(depth)]
+    magnitude = np.zeros(n * m, dtype=np.int64)
+    low = np.zeros(n * m, dtype=np.int64)
+    negative = np.zeros(n * m, dtype=bool)
+
+    def read(count):
+        nonlocal position
+        chunk = bits[position:position + count]
+        position += len(chunk)
+        return chunk
+
+    truncated = False
+    for p in range(top, -1, -1):
+        threshold = 1 << p
+        refined = np.flatnonzero(known[0])
+        for l in range(depth - 1, -1, -1):
+            candidates = ~known[l]
+            if l + 1 < depth:
+                candidates &= expand(known[l + 1])
+            index = np.flatnonzero(candidates)
+            flags = read(len(index))
+            known[l].ravel()[index[:len(flags)]] = flags
+            if l == 0:
+                new = index[:len(flags)][flags]
+                signs = read(len(new))
+                new = new[:len(signs)]
+                magnitude[new] = threshold
+                low[new] = p
+                negative[new] = signs
+                # Coefficients whose sign did not arrive stay insignificant.
+                known[0].ravel()[index[:len(flags)][flags][len(signs):]] = False
+                truncated = len(signs) < np.count_nonzero(flags)
+            if len(flags) < len(index):
+                truncated = True
+            if truncated:
+                break
+        if truncated:
+            break
+        refinement = read(len(refined))
+        magnitude[refined[:len(refinement)]] |= refinement.astype(np.int64) << p
+        low[refined[:len(refinement)]] = p
+        if len(refinement) < len(refined):
+            break
+
+    # Midpoint of the interval the undecoded low bits leave open.
+    significant = known[0].ravel()
+    values = np.where(significant, magnitude + ((1 << low) - 1) / 2, 0.0)
+    values = np.where(negative, -values, values).reshape(n, m)[:height, :width]
+    wavelet = WAVELETS[wavelet]
+    return values / subband_weights((height, width), levels, wavelet), (height, width), levels, wavelet
+
+def encode(image : np.array, levels : int = LEVELS, wavelet : str = dwt.WAVELET) -> bytes:
+    return encode_coefficients(dwt.compress(image, levels, wavelet=wavelet), image.shape, levels, wavelet)
+
+def decode(data : bytes):
+    coefficients, shape, levels, wavelet = decode_coefficients(data)
+    decompressed = dwt.decompress(coefficients, levels, wavelet=wavelet)
+    return np.clip(np.round(decompressed), 0, 255).astype(np.int16)
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+    megabytes = initial.size / 1e6
+
+    start = time.perf_counter()
+    data = encode(initial)
+    encoded = time.perf_counter()
+    full = decode(data)
+    decoded = time.perf_counter()
+
+    print(f"Embedded wavelet bitstream for {FILENAME} {initial.shape}, {LEVELS} levels")
+    print(f"full stream {len(data)} bytes, encode {megabytes / (encoded - start):.2f} MB/s, "
+          f"decode {megabytes / (decoded - encoded):.2f} MB/s, PSNR {psnr(initial, full):.2f}")
+    print("   bytes      bpp    PSNR")
+    for budget in [500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, len(data)]:
+        budget = min(budget, len(data))
+        image = decode(data[:budget])
+        print(f"{budget:8d} {8 * budget / initial.size:8.3f} {psnr(initial, image):7.2f}")
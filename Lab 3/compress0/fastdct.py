@@ -0,0 +1,107 @@
+import numpy as np
+
+# Arai-Agui-Nakajima butterfly DCT (the IJG float version). The 1-D passes
+# leave every output scaled by aan_scale[k], so the 2-D result is
+# 8 * aan_scale[u] * aan_scale[v] * F(u, v); those factors are folded into
+# the quantization table instead of being multiplied out per block.
+
+c4 = np.cos(np.pi / 4)
+c6 = np.cos(3 * np.pi / 8)
+c2_minus_c6 = np.sqrt(2) * np.cos(3 * np.pi / 8)
+c2_plus_c6 = np.sqrt(2) * np.cos(np.pi / 8)
+sqrt2 = np.sqrt(2)
+two_c2 = 2 * np.cos(np.pi / 8)
+two_c6_sqrt2 = 2 * np.sqrt(2) * np.cos(3 * np.pi / 8)
+two_c2_sqrt2 = 2 * np.sqrt(2) * np.cos(np.pi / 8)
+
+aan_scale = np.array([1.0] + [np.cos(k * np.pi / 16) * np.sqrt(2) for k in range(1, 8)])
+forward_scale = 8 * np.outer(aan_scale, aan_scale)
+inverse_scale = np.outer(aan_scale, aan_scale) / 8
+
+
+def aan_dct_1d(x : np.array, axis : int):
+    d = [x[(slice(None),) * axis + (k,)] for k in range(8)]
+    tmp0 = d[0] + d[7]
+    tmp7 = d[0] - d[7]
+    tmp1 = d[1] + d[6]
+    tmp6 = d[1] - d[6]
+    tmp2 = d[2] + d[5]
+    tmp5 = d[2] - d[5]
+    tmp3 = d[3] + d[4]
+    tmp4 = d[3] - d[4]
+
+    # Even part
+    tmp10 = tmp0 + tmp3
+    tmp13 = tmp0 - tmp3
+    tmp11 = tmp1 + tmp2
+    tmp12 = tmp1 - tmp2
+    z1 = (tmp12 + tmp13) * c4
+    out0 = tmp10 + tmp11
+    out4 = tmp10 - tmp11
+    out2 = tmp13 + z1
+    out6 = tmp13 - z1
+
+    # Odd part
+    tmp10 = tmp4 + tmp5
+    tmp11 = tmp5 + tmp6
+    tmp12 = tmp6 + tmp7
+    z5 = (tmp10 - tmp12) * c6
+    z2 = c2_minus_c6 * tmp10 + z5
+    z4 = c2_plus_c6 * tmp12 + z5
+    z3 = tmp11 * c4
+    z11 = tmp7 + z3
+    z13 = tmp7 - z3
+    out5 = z13 + z2
+    out3 = z13 - z2
+    out1 = z11 + z4
+    out7 = z11 - z4
+
+    return np.stack([out0, out1, out2, out3, out4, out5, out6, out7], axis=axis)
+
+def aan_idct_1d(x : np.array, axis : int):
+    d = [x[(slice(None),) * axis + (k,)] for k in range(8)]
+
+    # Even part
+    tmp10 = d[0] + d[4]
+    tmp11 = d[0] - d[4]
+    tmp13 = d[2] + d[6]
+    tmp12 = (d[2] - d[6]) * sqrt2 - tmp13
+    tmp0 = tmp10 + tmp13
+    tmp3 = tmp10 - tmp13
+    tmp1 = tmp11 + tmp12
+    tmp2 = tmp11 - tmp12
+
+    # Odd part
+    z13 = d[5] + d[3]
+    z10 = d[5] - d[3]
+    z11 = d[1] + d[7]
+    z12 = d[1] - d[7]
+    tmp7 = z11 + z13
+    tmp11 = (z11 - z13) * sqrt2
+    z5 = (z10 + z12) * two_c2
+    tmp10 = two_c6_sqrt2 * z12 - z5
+    tmp12 = -two_c2_sqrt2 * z10 + z5
+    tmp6 = tmp12 - tmp7
+    tmp5 = tmp11 - tmp6
+    tmp4 = tmp10 + tmp5
+
+    return np.stack([tmp0 + tmp7, tmp1 + tmp6, tmp2 + tmp5, tmp3 - tmp4,
+                     tmp3 + tmp4, tmp2 - tmp5, tmp1 - tmp6, tmp0 - tmp7], axis=axis)
+
+def to_planes(blocks : np.array):
+    # (..., 8, 8) blocks -> contiguous (8, 8, ...) planes, so every butterfly
+    # input is one contiguous slice covering all blocks.
+    return np.ascontiguousarray(np.moveaxis(blocks, (-2, -1), (0, 1)), dtype=np.float64)
+
+def from_planes(planes : np.array):
+    return np.moveaxis(planes, (0, 1), (-2, -1))
+
+def aan_dct(blocks : np.array):
+    # Scaled forward transform of every 8x8 block in a (..., 8, 8) array.
+    planes = to_planes(blocks)
+    return from_planes(aan_dct_1d(aan_dct_1d(planes, 1), 0))
+
+def aan_idct(blocks : np.array):
+    # Expects coefficients pre-multiplied by inverse_scale.
+    planes = to_planes(blocks)
+    return from_planes(aan_idct_1d(aan_idct_1d(planes, 0), 1))
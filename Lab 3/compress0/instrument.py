@@ -0,0 +1,214 @@
+import csv
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Named stage timers for the codec pipeline. Stages nest, and a stage is
+# reported under its path ("round_trip/dct.compress/dct.transform") with
+# call count, inclusive perf_counter_ns time and, when memory capture is
+# on, the tracemalloc peak above the memory held when the stage began.
+# Outside of a `with run(...)` block stage() returns a shared no-op
+# context manager, so instrumented code pays one flag check per stage.
+
+_enabled = False
+_memory = False
+_report = None
+_local = threading.local()
+
+
+class NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    __slots__ = ("path", "start", "base", "seen")
+
+    def __init__(self, name : str):
+        stack = _stack()
+        self.path = stack[-1].path + "/" + name if stack else name
+
+    def __enter__(self):
+        stack = _stack()
+        if _memory:
+            # Each stage resets the tracemalloc peak, so the enclosing stage
+            # keeps the peak it had seen so far.
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].seen = max(stack[-1].seen, peak)
+            tracemalloc.reset_peak()
+            self.base = self.seen = current
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception):
+        elapsed = time.perf_counter_ns() - self.start
+        _stack().pop()
+        peak = max(self.seen, tracemalloc.get_traced_memory()[1]) - self.base if _memory else 0
+        entry = _report.setdefault(self.path, [0, 0, 0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], peak)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def stage(name : str):
+    return Stage(name) if _enabled else NULL_STAGE
+
+def timed(name : str):
+    # Decorator form of stage() for whole functions.
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class Run:
+    # Collects the stages of one run; as_dict() is the per-run report.
+
+    def __init__(self, name : str = "run", memory : bool = False):
+        self.name = name
+        self.memory = memory
+        self.stages = {}
+        self.total_ns = 0
+
+    def __enter__(self):
+        global _enabled, _memory, _report
+        self.previous = (_enabled, _memory, _report)
+        self.started_tracing = self.memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        _enabled, _memory, _report = True, self.memory, self.stages
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception):
+        global _enabled, _memory, _report
+        self.total_ns = time.perf_counter_ns() - self.start
+        _enabled, _memory, _report = self.previous
+        if self.started_tracing:
+            tracemalloc.stop()
+        return False
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "total_ns": self.total_ns,
+            "stages": {path: {"calls": calls, "ns": ns, "peak_bytes": peak}
+                       for path, (calls, ns, peak) in self.stages.items()},
+        }
+
+def run(name : str = "run", memory : bool = False):
+    return Run(name, memory)
+
+
+def aggregate(reports):
+    # Sums calls and time over per-run reports; peaks are the maximum.
+    stages = {}
+    for report in reports:
+        for path, values in report["stages"].items():
+            total = stages.setdefault(path, {"calls": 0, "ns": 0, "peak_bytes": 0})
+            total["calls"] += values["calls"]
+            total["ns"] += values["ns"]
+            total["peak_bytes"] = max(total["peak_bytes"], values["peak_bytes"])
+    return {
+        "name": "aggregate",
+        "runs": len(reports),
+        "total_ns": sum(report["total_ns"] for report in reports),
+        "stages": stages,
+    }
+
+def rows(report):
+    for path, values in report["stages"].items():
+        yield {
+            "run": report["name"],
+            "stage": path,
+            "calls": values["calls"],
+            "ms": values["ns"] / 1e6,
+            "share": values["ns"] / report["total_ns"] if report["total_ns"] else 0.0,
+            "peak_kib": values["peak_bytes"] / 1024,
+        }
+
+def write_json(file_path : str, reports):
+    with open(file_path, "w") as file:
+        json.dump({"runs": reports, "aggregate": aggregate(reports)}, file, indent=2)
+
+def write_csv(file_path : str, reports):
+    # One row per (run, stage), followed by the aggregate's rows.
+    with open(file_path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["run", "stage", "calls", "ms", "share", "peak_kib"])
+        writer.writeheader()
+        for report in list(reports) + [aggregate(reports)]:
+            writer.writerows(rows(report))
+
+def format_report(report):
+    lines = [f"{report['name']}: {report['total_ns'] / 1e6:.2f} ms",
+             "  stage                                            calls        ms  share   peak KiB"]
+    for row in rows(report):
+        lines.append(f"  {row['stage']:48s} {row['calls']:5d} {row['ms']:9.2f} {100 * row['share']:5.1f}% "
+                     f"{row['peak_kib']:10.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Under -m this file is __main__; the codecs report to the package's copy.
+    from . import dct
+    from . import instrument
+    from . import utils
+    from .loader import load_image, to_image
+    from .metrics import psnr
+
+    names = sys.argv[1:] or [utils.package_path("input", name) for name in ["lena.png", "square.png", "single.png"]]
+    output_path = utils.package_path("dct", "instrumented.png")
+
+    def round_trip(file_path : str):
+        with instrument.stage("round_trip"):
+            initial = load_image(file_path)
+            compressed = dct.compress(initial)
+            to_image(utils.scale_matrix(compressed), output_path)
+            decompressed = dct.decompress(compressed, initial.shape)
+            to_image(decompressed, output_path)
+            return psnr(initial, decompressed)
+
+    reports = []
+    for file_path in names:
+        with instrument.run(file_path.split("/")[-1], memory=True) as measured:
+            round_trip(file_path)
+        reports.append(measured.as_dict())
+        print(instrument.format_report(reports[-1]))
+    print(instrument.format_report(instrument.aggregate(reports)))
+
+    repeat = 50
+    start = time.perf_counter()
+    for _ in range(repeat):
+        round_trip(names[0])
+    disabled = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with instrument.run("timing only"):
+            round_trip(names[0])
+    enabled = (time.perf_counter() - start) / repeat
+    print(f"round trip of {names[0].split('/')[-1]}: {1000 * disabled:.3f} ms disabled, {1000 * enabled:.3f} ms timed")
+    os.remove(output_path)
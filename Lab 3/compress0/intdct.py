@@ -0,0 +1,78 @@
+import hashlib
+import sys
+
+import numpy as np
+
+from . import dct
+from . import utils
+from .metrics import psnr
+from .loader import load_image
+
+# Fixed-point DCT in the style of the IJG "islow" transform: the DCT matrix
+# is scaled by 2**CONST_BITS, the intermediate between the two passes keeps
+# PASS1_BITS extra bits, and every descale rounds half up with a shift.
+# All intermediates fit in int32 for 8-bit samples and 12-bit coefficients.
+CONST_BITS = 13
+PASS1_BITS = 2
+COEFFICIENT_RANGE = (-2048, 2047)
+
+t_int = np.round(dct.t_matrix * (1 << CONST_BITS)).astype(np.int32)
+
+
+def descale(x : np.array, n : int):
+    return (x + (1 << (n - 1))) >> n
+
+def divide_round(numerator : np.array, denominator : np.array):
+    # Integer division rounding half away from zero.
+    magnitude = (np.abs(numerator) + (denominator >> 1)) // denominator
+    return np.where(numerator < 0, -magnitude, magnitude)
+
+def forward(blocks : np.array):
+    # Returns the DCT scaled by 2**(CONST_BITS + PASS1_BITS).
+    shifted = blocks.astype(np.int32) - 128
+    rows = descale(shifted @ t_int.T, CONST_BITS - PASS1_BITS)
+    return t_int @ rows
+
+def inverse(coefficients : np.array):
+    columns = descale(t_int.T @ coefficients, CONST_BITS - PASS1_BITS)
+    return descale(columns @ t_int, CONST_BITS + PASS1_BITS)
+
+def compress_block(block : np.array, table : np.array = dct.quantization_table):
+    scaled_table = table.astype(np.int32) << (CONST_BITS + PASS1_BITS)
+    return divide_round(forward(block), scaled_table).astype(np.int16)
+
+def compress(input_image : np.array, table : np.array = dct.quantization_table):
+    blocks = utils.to_blocks(utils.pad_to_blocks(input_image))
+    return utils.from_blocks(compress_block(blocks, table))
+
+def decompress_block(block : np.array, table : np.array = dct.quantization_table):
+    dequantized = np.clip(block.astype(np.int32) * table.astype(np.int32), *COEFFICIENT_RANGE)
+    return np.clip(inverse(dequantized) + 128, 0, 255).astype(np.int16)
+
+def decompress(input_image : np.array, shape=None, table : np.array = dct.quantization_table):
+    blocks = utils.to_blocks(input_image)
+    return utils.crop(utils.from_blocks(decompress_block(blocks, table)), shape)
+
+def digest(array : np.array):
+    # Decoded output is bit-exact across platforms, so a content hash can
+    # key a cache of decoded tiles.
+    return hashlib.blake2b(np.ascontiguousarray(array).tobytes(), digest_size=16).hexdigest()
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+
+    float_coefficients = dct.compress(initial)
+    float_decoded = dct.decompress(float_coefficients, initial.shape)
+    int_coefficients = compress(initial)
+    int_decoded = decompress(int_coefficients, initial.shape)
+
+    float_psnr = psnr(initial, float_decoded)
+    int_psnr = psnr(initial, int_decoded)
+    print(f"Fixed-point DCT of {FILENAME} {initial.shape}")
+    print(f"PSNR float {float_psnr:.4f}, integer {int_psnr:.4f}, delta {int_psnr - float_psnr:+.4f}")
+    print(f"coefficients equal to the float path: {np.mean(int_coefficients == float_coefficients):.6f}")
+    print(f"coefficient plane: {int_coefficients.dtype} {int_coefficients.nbytes} bytes, "
+          f"float path quantizes a {float_coefficients.size * 8} byte float64 plane")
+    print(f"decoded digest: {digest(int_decoded)}")
@@ -0,0 +1,235 @@
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# Backend registry for the transform kernels. A family groups
+# interchangeable backends for one kernel together with its reference
+# backend; the codecs register their own families (dct engines, Haar pyramid
+# levels, dwt_custom blocks) next to the built-in "block" family, the
+# separable 8x8 transform matrix @ block @ matrix.T. On first use for a block count, choose() checks
+# every backend against the reference, times the ones that pass on a short
+# sample and remembers the fastest per host in a JSON file, so later
+# processes skip the microbenchmark. Autotuning is opt-in: unless it is
+# enabled, default() returns the reference and nothing is timed or written.
+
+# Block counts are grouped into these buckets; each bucket is tuned once.
+BUCKETS = (1, 64, 4096, 32768)
+# Blocks processed per timing, so small buckets repeat the call.
+BENCH_BLOCKS = 512
+REPEAT = 3
+# Maximum difference from the reference relative to its largest magnitude;
+# integer outputs (anything not listed) must match exactly.
+TOLERANCE = {np.dtype(np.float32): 1e-4, np.dtype(np.float64): 1e-9}
+CHECK_COUNTS = (1, 3, 100)
+CACHE_PATH = os.environ.get("COMPRESS0_KERNEL_CACHE",
+                            os.path.join(os.path.expanduser("~"), ".cache", "compress0", "kernels.json"))
+# COMPRESS0_AUTOTUNE=1 lets the codecs' default paths use the tuned backends.
+AUTOTUNE = os.environ.get("COMPRESS0_AUTOTUNE", "0") == "1"
+
+_kron_matrices = {}
+
+# sample(count, rng) returns the arguments of one call for `count` blocks,
+# call(backend, args) runs a backend and returns a tuple of arrays.
+Family = namedtuple("Family", ["reference", "backends", "sample", "call"])
+
+
+def matmul(matrix : np.array, blocks : np.array):
+    return matrix @ blocks @ matrix.T
+
+def einsum(matrix : np.array, blocks : np.array):
+    return np.einsum("ij,...jk,lk->...il", matrix, blocks, matrix, optimize=True)
+
+def kron(matrix : np.array, blocks : np.array):
+    # Both passes as one 64x64 product on flattened blocks: vec(M X M^T) is
+    # kron(M, M) vec(X) in row-major order.
+    size = matrix.shape[0]
+    key = (matrix.dtype.str, matrix.tobytes())
+    if key not in _kron_matrices:
+        _kron_matrices[key] = np.kron(matrix, matrix).T
+    flat = blocks.reshape(-1, size * size) @ _kron_matrices[key]
+    return flat.reshape(blocks.shape[:-2] + (size, size))
+
+def numba_block():
+    # JIT backend, only when Numba is installed.
+    try:
+        import numba
+    except ImportError:
+        return None
+
+    @numba.njit(cache=True)
+    def separable(matrix, blocks, out):
+        size = matrix.shape[0]
+        temp = np.empty((size, size), dtype=out.dtype)
+        for b in range(blocks.shape[0]):
+            for i in range(size):
+                for k in range(size):
+                    total = 0.0
+                    for j in range(size):
+                        total += matrix[i, j] * blocks[b, j, k]
+                    temp[i, k] = total
+            for i in range(size):
+                for l in range(size):
+                    total = 0.0
+                    for k in range(size):
+                        total += temp[i, k] * matrix[l, k]
+                    out[b, i, l] = total
+
+    def jit(matrix : np.array, blocks : np.array):
+        dtype = np.result_type(matrix, blocks)
+        flat = np.ascontiguousarray(blocks.reshape((-1,) + blocks.shape[-2:]), dtype=dtype)
+        out = np.empty_like(flat)
+        separable(np.ascontiguousarray(matrix, dtype=dtype), flat, out)
+        return out.reshape(blocks.shape)
+    return jit
+
+def block_sample(count : int, rng):
+    matrix = rng.standard_normal((8, 8)).astype(np.float32)
+    return matrix, rng.uniform(-255, 255, (count, 8, 8)).astype(np.float32)
+
+block_backends = {"matmul": matmul, "einsum": einsum, "kron": kron}
+jit = numba_block()
+if jit is not None:
+    block_backends["numba"] = jit
+
+families = {"block": Family("matmul", block_backends, block_sample, lambda backend, args: (backend(*args),))}
+_choices = None
+_checked = {}
+_lock = threading.Lock()
+
+
+def register_family(name : str, family : Family):
+    families[name] = family
+
+def register(family : str, name : str, backend):
+    families[family].backends[name] = backend
+
+def bucket(count : int):
+    return max(b for b in BUCKETS if b <= max(count, 1))
+
+def host_key():
+    # Choices are only reused on the same machine type and library versions.
+    return (f"{platform.machine()}-{platform.python_implementation()}{platform.python_version()}"
+            f"-numpy{np.__version__}-cpus{os.cpu_count()}-{'+'.join(sorted(block_backends))}")
+
+def load_choices():
+    try:
+        with open(CACHE_PATH) as file:
+            return json.load(file).get(host_key(), {})
+    except (OSError, ValueError):
+        return {}
+
+def save_choices(choices : dict):
+    # Written to a temporary file and renamed, so concurrent processes never
+    # read half a file; an unwritable cache only costs a re-tune.
+    try:
+        with open(CACHE_PATH) as file:
+            stored = json.load(file)
+    except (OSError, ValueError):
+        stored = {}
+    stored[host_key()] = choices
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        temporary = f"{CACHE_PATH}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(stored, file, indent=2, sort_keys=True)
+        os.replace(temporary, CACHE_PATH)
+    except OSError:
+        pass
+
+def compare(outputs, expected):
+    # Largest difference relative to the reference magnitude, or inf when
+    # the shapes or dtypes differ.
+    worst = 0.0
+    for output, reference in zip(outputs, expected):
+        output = np.asarray(output)
+        if output.shape != reference.shape or output.dtype != reference.dtype:
+            return float("inf")
+        scale = max(1.0, float(np.max(np.abs(reference), initial=0)))
+        worst = max(worst, float(np.max(np.abs(output - reference), initial=0)) / scale)
+    return worst
+
+def check(family : str, name : str):
+    # Equivalence with the reference on a few batch sizes, once per process.
+    if (family, name) not in _checked:
+        kernel_family = families[family]
+        rng = np.random.default_rng(0)
+        passed = True
+        for count in CHECK_COUNTS:
+            args = kernel_family.sample(count, rng)
+            expected = kernel_family.call(kernel_family.backends[kernel_family.reference], args)
+            try:
+                error = compare(kernel_family.call(kernel_family.backends[name], args), expected)
+            except Exception:
+                error = float("inf")
+            passed = passed and error <= TOLERANCE.get(expected[0].dtype, 0)
+        _checked[(family, name)] = passed
+    return _checked[(family, name)]
+
+def measure(family : str, name : str, count : int):
+    # Best time per block over REPEAT timings of about BENCH_BLOCKS blocks.
+    kernel_family = families[family]
+    backend = kernel_family.backends[name]
+    args = kernel_family.sample(count, np.random.default_rng(1))
+    number = max(1, BENCH_BLOCKS // count)
+    kernel_family.call(backend, args)
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(number):
+            kernel_family.call(backend, args)
+        best = min(best, time.perf_counter() - start)
+    return best / (number * count)
+
+def autotune(family : str, count : int):
+    # Returns the fastest passing backend and the per-block times.
+    timings = {name: measure(family, name, bucket(count)) for name in families[family].backends
+               if check(family, name)}
+    return min(timings, key=timings.get), timings
+
+def choose(family : str, count : int = 1):
+    global _choices
+    kernel_family = families[family]
+    key = f"{family}/{bucket(count)}"
+    if _choices is None or key not in _choices or _choices[key] not in kernel_family.backends:
+        with _lock:
+            if _choices is None:
+                _choices = load_choices()
+            if key not in _choices or _choices[key] not in kernel_family.backends:
+                _choices[key] = autotune(family, count)[0]
+                save_choices(_choices)
+    return _choices[key]
+
+def default(family : str, count : int = 1):
+    # The backend the codecs use when the caller does not name one.
+    return choose(family, count) if AUTOTUNE else families[family].reference
+
+def block_transform(matrix : np.array, blocks : np.array, backend : str = None):
+    return block_backends[backend or default("block", blocks.size // 64)](matrix, blocks)
+
+
+if __name__ == "__main__":
+    # Re-tunes every family and bucket, prints the equivalence checks and
+    # timings and stores the choices. Under -m this file is __main__, so
+    # the registry is the package's copy.
+    from . import dct
+    from . import dwt
+    from . import dwt_custom
+    from . import kernels
+
+    print(f"host {kernels.host_key()}, cache {kernels.CACHE_PATH}")
+    choices = kernels.load_choices()
+    for family in sys.argv[1:] or list(kernels.families):
+        failed = [name for name in kernels.families[family].backends if not kernels.check(family, name)]
+        print(f"{family}: reference {kernels.families[family].reference}, failed checks: {', '.join(failed) or 'none'}")
+        for count in kernels.BUCKETS:
+            best, timings = kernels.autotune(family, count)
+            choices[f"{family}/{count}"] = best
+            line = "  ".join(f"{name} {1e9 * seconds:9.1f}" for name, seconds in timings.items())
+            print(f"  {count:6d} blocks, ns/block: {line}  -> {best}")
+    kernels.save_choices(choices)
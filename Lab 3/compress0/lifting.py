@@ -0,0 +1,88 @@
+import numpy as np
+
+# Biorthogonal CDF lifting steps on split (even, odd) sample arrays along the
+# last axis, with whole-sample symmetric extension at both ends. Even
+# samples become the approximation band (length ceil(n / 2)), odd samples
+# the detail band.
+
+# CDF 9/7 lifting constants (Daubechies & Sweldens).
+ALPHA = -1.586134342059924
+BETA = -0.052980118572961
+GAMMA = 0.882911075530934
+DELTA = 0.443506852043971
+K = 1.230174104914001
+
+
+def next_even(even : np.array, n_odd : int):
+    # even[i + 1] for every odd index i, mirroring past the right edge.
+    if even.shape[-1] > n_odd:
+        return even[..., 1:n_odd + 1]
+    return np.concatenate([even[..., 1:], even[..., -1:]], axis=-1)
+
+def previous_odd(odd : np.array, n_even : int):
+    # odd[i - 1] for every even index i, with odd[-1] mirrored to odd[0].
+    return np.concatenate([odd[..., :1], odd[..., :n_even - 1]], axis=-1)
+
+def this_odd(odd : np.array, n_even : int):
+    # odd[i] for every even index i, mirroring past the right edge.
+    if n_even > odd.shape[-1]:
+        return np.concatenate([odd, odd[..., -1:]], axis=-1)
+    return odd
+
+
+def cdf53_forward(even : np.array, odd : np.array):
+    # Reversible integer 5/3 (JPEG 2000 lossless); exact on integer input.
+    n_even = even.shape[-1]
+    odd = odd - np.floor((even[..., :odd.shape[-1]] + next_even(even, odd.shape[-1])) / 2)
+    even = even + np.floor((previous_odd(odd, n_even) + this_odd(odd, n_even) + 2) / 4)
+    return even, odd
+
+def cdf53_inverse(even : np.array, odd : np.array):
+    n_even = even.shape[-1]
+    even = even - np.floor((previous_odd(odd, n_even) + this_odd(odd, n_even) + 2) / 4)
+    odd = odd + np.floor((even[..., :odd.shape[-1]] + next_even(even, odd.shape[-1])) / 2)
+    return even, odd
+
+def cdf97_forward(even : np.array, odd : np.array):
+    # Scaled so that, like the Haar avg/dif pair, both bands are the
+    # orthonormal outputs divided by sqrt(2): DC gain 1 on the low band.
+    n_even = even.shape[-1]
+    n_odd = odd.shape[-1]
+    odd = odd + ALPHA * (even[..., :n_odd] + next_even(even, n_odd))
+    even = even + BETA * (previous_odd(odd, n_even) + this_odd(odd, n_even))
+    odd = odd + GAMMA * (even[..., :n_odd] + next_even(even, n_odd))
+    even = even + DELTA * (previous_odd(odd, n_even) + this_odd(odd, n_even))
+    return even / K, odd * (K / 2)
+
+def cdf97_inverse(even : np.array, odd : np.array):
+    n_even = even.shape[-1]
+    n_odd = odd.shape[-1]
+    even = even * K
+    odd = odd * (2 / K)
+    even = even - DELTA * (previous_odd(odd, n_even) + this_odd(odd, n_even))
+    odd = odd - GAMMA * (even[..., :n_odd] + next_even(even, n_odd))
+    even = even - BETA * (previous_odd(odd, n_even) + this_odd(odd, n_even))
+    odd = odd - ALPHA * (even[..., :n_odd] + next_even(even, n_odd))
+    return even, odd
+
+
+def lift_with(step, block : np.array, axis : int):
+    # In-place analysis along one axis, output layout [approximation | detail].
+    view = np.moveaxis(block, axis, -1)
+    n = view.shape[-1]
+    if n < 2:
+        return
+    n_even = (n + 1) // 2
+    approximation, detail = step(view[..., 0::2], view[..., 1::2])
+    view[..., :n_even] = approximation
+    view[..., n_even:] = detail
+
+def unlift_with(step, block : np.array, axis : int):
+    view = np.moveaxis(block, axis, -1)
+    n = view.shape[-1]
+    if n < 2:
+        return
+    n_even = (n + 1) // 2
+    even, odd = step(view[..., :n_even].copy(), view[..., n_even:].copy())
+    view[..., 0::2] = even
+    view[..., 1::2] = odd
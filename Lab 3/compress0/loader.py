@@ -1,12 +1,38 @@
-from PIL import Image
 import numpy as np
 
+from . import instrument
+
+# PIL is imported on first use so that importing the codecs stays cheap.
+
+@instrument.timed("load_image")
 def load_image(file_path : str):
+    from PIL import Image
     image = Image.open(file_path).convert('L')
     image_matrix = np.array(image)
     return image_matrix.astype(np.int16)
 
+@instrument.timed("load_image")
+def load_color_image(file_path : str):
+    from PIL import Image
+    image = Image.open(file_path).convert('RGB')
+    image_matrix = np.array(image)
+    return image_matrix.astype(np.int16)
+
+@instrument.timed("save_image")
 def to_image(array : np.array, file_path : str):
-    array_clipped = np.clip(array, 0, 255).astype(np.uint8)
+    from PIL import Image
+    array_clipped = np.clip(array, 0, 255, out=np.empty(array.shape, dtype=np.uint8), casting='unsafe')
     image = Image.fromarray(array_clipped, mode='L')
-    image.save(file_path)
\ No newline at end of file
+    image.save(file_path)
+
+@instrument.timed("save_image")
+def to_color_image(array : np.array, file_path : str):
+    from PIL import Image
+    array_clipped = np.clip(array, 0, 255, out=np.empty(array.shape, dtype=np.uint8), casting='unsafe')
+    image = Image.fromarray(array_clipped, mode='RGB')
+    image.save(file_path)
+
+def open_memmap(file_path : str, shape=None, dtype=np.uint8):
+    if file_path.endswith(".npy"):
+        return np.load(file_path, mmap_mode='r')
+    return np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
@@ -0,0 +1,77 @@
+import numpy as np
+
+from . import instrument
+
+PEAK = 255
+STRIP_ROWS = 512
+
+
+def _strips(n : int, strip_rows):
+    if strip_rows is None:
+        yield 0, n
+        return
+    for start in range(0, n, strip_rows):
+        yield start, min(start + strip_rows, n)
+
+def error_totals(image1 : np.array, image2 : np.array, strip_rows=None):
+    # Only one float64 strip of the difference is alive at a time, so memory
+    # mapped inputs are never fully copied into RAM.
+    if image1.shape != image2.shape:
+        raise ValueError(f"Shape mismatch: {image1.shape} and {image2.shape}")
+    n = image1.shape[0]
+    sum_sq = 0.0
+    sum_abs = 0.0
+    max_abs = 0.0
+    for start, end in _strips(n, strip_rows):
+        dev = np.subtract(image1[start:end], image2[start:end], dtype=np.float64).ravel()
+        sum_sq += float(np.dot(dev, dev))
+        np.abs(dev, out=dev)
+        if dev.size:
+            sum_abs += float(dev.sum())
+            max_abs = max(max_abs, float(dev.max()))
+    return sum_sq, sum_abs, max_abs, image1.size
+
+def mse(image1 : np.array, image2 : np.array, strip_rows=None):
+    sum_sq, _, _, count = error_totals(image1, image2, strip_rows)
+    return sum_sq / count
+
+def mae(image1 : np.array, image2 : np.array, strip_rows=None):
+    _, sum_abs, _, count = error_totals(image1, image2, strip_rows)
+    return sum_abs / count
+
+def max_error(image1 : np.array, image2 : np.array, strip_rows=None):
+    _, _, max_abs, _ = error_totals(image1, image2, strip_rows)
+    return max_abs
+
+def psnr_from_mse(_mse : float, r : int = PEAK):
+    if _mse != 0:
+        return 10 * np.log10(r * r / _mse)
+    return -1
+
+@instrument.timed("psnr")
+def psnr(image1 : np.array, image2 : np.array, strip_rows=None):
+    return psnr_from_mse(mse(image1, image2, strip_rows))
+
+def score(image1 : np.array, image2 : np.array, strip_rows=None, structural : bool = False):
+    # structural adds SSIM and MS-SSIM (NaN for images below their minimum size).
+    sum_sq, sum_abs, max_abs, count = error_totals(image1, image2, strip_rows)
+    _mse = sum_sq / count
+    result = {
+        "mse": _mse,
+        "psnr": psnr_from_mse(_mse),
+        "mae": sum_abs / count,
+        "max_error": max_abs,
+    }
+    if structural:
+        from . import ssim
+        result["ssim"] = ssim.ssim(image1, image2, strip_rows)
+        result["ms_ssim"] = ssim.ms_ssim(image1, image2, strip_rows)
+    return result
+
+def score_batch(pairs, strip_rows=None, structural : bool = False):
+    return [score(original, decoded, strip_rows, structural) for original, decoded in pairs]
+
+def score_files(file_path1 : str, file_path2 : str, shape=None, dtype=np.uint8, strip_rows=STRIP_ROWS,
+                structural : bool = False):
+    from .loader import open_memmap
+    return score(open_memmap(file_path1, shape, dtype), open_memmap(file_path2, shape, dtype), strip_rows, structural)
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import dct
+from . import deadzone
+from . import dwt
+from . import dwt_custom
+from . import utils
+from .benchmark import generated_image
+
+# Strip parallelism inside one image. The block codecs split the image into
+# horizontal strips of whole 8-row block rows; the pyramid DWT splits each
+# level's row pass into row strips and its column pass into column strips.
+# Threads write disjoint parts of one preallocated output, and NumPy drops
+# the GIL inside matmul and the elementwise kernels, so strips run
+# concurrently.
+
+THREADS = os.cpu_count() or 1
+# Strips per thread, so a slow strip does not hold the others back.
+OVERSPLIT = 4
+# codec -> (module, coefficient dtype)
+CODECS = {"dct": (dct, np.int16), "dwt_custom": (dwt_custom, np.float32)}
+
+
+def strips(length : int, count : int, step : int = 1):
+    # `count` slices of about equal length covering range(length), with
+    # every boundary a multiple of `step`.
+    units = -(-length // step)
+    count = max(1, min(count, units))
+    bounds = [step * (units * k // count) for k in range(count)] + [length]
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def run(pool : ThreadPoolExecutor, function, slices):
+    # map() re-raises the first exception from a worker.
+    for _ in pool.map(function, slices):
+        pass
+
+def compress(image : np.array, codec : str = "dct", threads : int = THREADS, table=None):
+    (module, dtype) = CODECS[codec]
+    padded = (image.shape[0] + (-image.shape[0] % utils.BLOCK_SIZE),
+              image.shape[1] + (-image.shape[1] % utils.BLOCK_SIZE))
+    output = np.empty(padded, dtype=dtype)
+    arguments = () if table is None else (table,)
+
+    def work(rows):
+        result = module.compress(image[rows], *arguments)
+        output[rows.start:rows.start + result.shape[0]] = result
+
+    with ThreadPoolExecutor(threads) as pool:
+        run(pool, work, strips(image.shape[0], threads * OVERSPLIT, utils.BLOCK_SIZE))
+    return output
+
+def decompress(coefficients : np.array, shape, codec : str = "dct", threads : int = THREADS, table=None):
+    (module, _) = CODECS[codec]
+    output = np.empty(shape, dtype=np.int16 if codec == "dct" else np.float32)
+    arguments = () if table is None else (table,)
+
+    def work(rows):
+        height = min(rows.stop, shape[0]) - rows.start
+        output[rows.start:rows.start + height] = module.decompress(coefficients[rows], (height, shape[1]), *arguments)
+
+    with ThreadPoolExecutor(threads) as pool:
+        run(pool, work, strips(coefficients.shape[0], threads * OVERSPLIT, utils.BLOCK_SIZE))
+    return output
+
+def transform(block : np.array, levels : int, wavelet : str, pool : ThreadPoolExecutor, count : int, inverse=False):
+    # In-place pyramid DWT with each 1-D pass split across the pool; the
+    # passes themselves stay in order.
+    (forward, backward) = dwt.filters("pyramid", wavelet)
+    order = reversed(range(levels)) if inverse else range(levels)
+    for level in order:
+        (n, m) = dwt.band_shape(block.shape, level)
+        band = block[:n, :m]
+        row_pass = lambda rows: (backward if inverse else forward)(band[rows], 1)
+        column_pass = lambda columns: (backward if inverse else forward)(band[:, columns], 0)
+        if inverse:
+            run(pool, column_pass, strips(m, count))
+            run(pool, row_pass, strips(n, count))
+        else:
+            run(pool, row_pass, strips(n, count))
+            run(pool, column_pass, strips(m, count))
+    return block
+
+def dwt_compress(image : np.array, levels : int = dwt.LEVELS, wavelet : str = dwt.WAVELET,
+                 threads : int = THREADS, table : dict = None):
+    block = image.astype(np.float32)
+    with ThreadPoolExecutor(threads) as pool:
+        transform(block, levels, wavelet, pool, threads * OVERSPLIT)
+        if table is not None:
+            steps = dwt.step_map(block.shape, levels, table)
+            run(pool, lambda rows: deadzone.quantize(block[rows], steps[rows], out=block[rows]),
+                strips(block.shape[0], threads * OVERSPLIT))
+        run(pool, lambda rows: np.rint(block[rows], out=block[rows]), strips(block.shape[0], threads * OVERSPLIT))
+    return block
+
+def dwt_decompress(coefficients : np.array, levels : int = dwt.LEVELS, wavelet : str = dwt.WAVELET,
+                   threads : int = THREADS, table : dict = None):
+    block = coefficients.astype(np.float32)
+    with ThreadPoolExecutor(threads) as pool:
+        if table is not None:
+            steps = dwt.step_map(block.shape, levels, table)
+            run(pool, lambda rows: deadzone.dequantize(block[rows], steps[rows], out=block[rows]),
+                strips(block.shape[0], threads * OVERSPLIT))
+        transform(block, levels, wavelet, pool, threads * OVERSPLIT, inverse=True)
+    return block
+
+
+def serial_round_trip(codec : str, image : np.array):
+    if codec == "dwt":
+        coefficients = dwt.compress(image)
+        return coefficients, dwt.decompress(coefficients)
+    (module, _) = CODECS[codec]
+    coefficients = module.compress(image)
+    return coefficients, module.decompress(coefficients, image.shape)
+
+def parallel_round_trip(codec : str, image : np.array, threads : int):
+    # Returns the coefficients, the decoded image and both timings.
+    start = time.perf_counter()
+    if codec == "dwt":
+        coefficients = dwt_compress(image, threads=threads)
+    else:
+        coefficients = compress(image, codec, threads)
+    middle = time.perf_counter()
+    if codec == "dwt":
+        decoded = dwt_decompress(coefficients, threads=threads)
+    else:
+        decoded = decompress(coefficients, image.shape, codec, threads)
+    return coefficients, decoded, middle - start, time.perf_counter() - middle
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    image = generated_image(size)
+    counts = sorted({1, 2, 4, 8, THREADS})
+    print(f"Strip-parallel round trips of a {size}x{size} image, {THREADS} CPUs")
+    print("codec       threads  compress ms  decompress ms  speedup  identical")
+    for name in ("dct", "dwt_custom", "dwt"):
+        expected = serial_round_trip(name, image)
+        base = None
+        for threads in counts:
+            coefficients, decoded, forward, inverse = parallel_round_trip(name, image, threads)
+            base = base or forward + inverse
+            same = np.array_equal(coefficients, expected[0]) and np.array_equal(decoded, expected[1])
+            print(f"{name:11s} {threads:7d} {1000 * forward:12.1f} {1000 * inverse:14.1f} "
+                  f"{base / (forward + inverse):8.2f}  {same}")
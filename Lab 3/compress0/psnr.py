@@ -1,17 +1,11 @@
 import numpy as np
+
+from . import metrics
+
+
 def mse(image1 : np.array, image2: np.array):
-    [n, m] = image1.shape
-    dev_sum = 0
-    for i in range(0, n):
-        for j in range(0, m):
-            dev = image1[i, j] - image2[i, j]
-            dev_sum += dev.item() * dev.item()
-    return dev_sum / (m * n)
+    return metrics.mse(image1, image2)
 
 
 def psnr(image1 : np.array, image2 : np.array):
-    r = 255
-    _mse = mse(image1, image2)
-    if _mse != 0:
-        return 10 * np.log10(r*r/_mse)
-    return -1
\ No newline at end of file
+    return metrics.psnr(image1, image2)
@@ -0,0 +1,82 @@
+import sys
+
+import numpy as np
+
+from . import bitstream
+from . import dct
+from . import utils
+from .metrics import psnr
+from .loader import load_image
+
+# Upper bound for the float64 temporaries of one vectorized group of
+# quality levels in sweep().
+MEMORY_BUDGET = 256 * 2 ** 20
+QUALITIES = [5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 95]
+
+_table_cache = {}
+
+
+def quality_scale(quality : int):
+    if not 1 <= quality <= 100:
+        raise ValueError(f"Quality must be between 1 and 100, got {quality}")
+    # Integer division, as in libjpeg's jpeg_quality_scaling.
+    return 5000 // quality if quality < 50 else 200 - 2 * quality
+
+def scaled_table(quality : int, base : np.array = dct.quantization_table):
+    # Standard IJG scaling of a base table; results are cached read-only.
+    key = (quality, base.tobytes())
+    table = _table_cache.get(key)
+    if table is None:
+        table = np.floor((base * quality_scale(quality) + 50) / 100)
+        table = np.clip(table, 1, 255).astype(np.int64)
+        table.setflags(write=False)
+        _table_cache[key] = table
+    return table
+
+def estimate_bits(quantized : np.array):
+    # Zeroth-order entropy of each of the 64 coefficient positions, taken
+    # over all blocks; quantized has shape (..., 8, 8).
+    values = quantized.reshape(-1, 64).astype(np.int64)
+    low = int(values.min())
+    span = int(values.max()) - low + 1
+    keys = (values - low) + np.arange(64) * span
+    counts = np.bincount(keys.ravel(), minlength=64 * span).reshape(64, span).astype(np.float64)
+    n = values.shape[0]
+    p = counts / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.nansum(p * np.log2(p), axis=1)
+    return float(n * entropy.sum())
+
+def sweep(image : np.array, qualities=QUALITIES, base : np.array = dct.quantization_table,
+          memory_budget : int = MEMORY_BUDGET):
+    # The forward DCT runs once; each quality level only re-quantizes,
+    # dequantizes and runs the inverse transform, several levels at a time.
+    blocks = utils.to_blocks(utils.pad_to_blocks(image))
+    coefficients = dct.dct(blocks - 128)
+    group = max(1, memory_budget // (coefficients.nbytes * 3))
+    results = []
+    for start in range(0, len(qualities), group):
+        levels = qualities[start:start + group]
+        tables = np.stack([scaled_table(q, base) for q in levels])[:, None, None]
+        quantized = np.round(coefficients / tables).astype(np.int16)
+        decoded = np.clip(dct.idct(quantized * tables) + 128, 0, 255).astype(np.int16)
+        for k, quality in enumerate(levels):
+            decompressed = utils.crop(utils.from_blocks(decoded[k]), image.shape)
+            bits = estimate_bits(quantized[k])
+            results.append({
+                "quality": quality,
+                "psnr": psnr(image, decompressed),
+                "bits": bits,
+                "bpp": bits / image.size,
+            })
+    return results
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+    print(f"Rate-distortion sweep of {FILENAME} {initial.shape}")
+    print("quality    PSNR  estimated bpp  bitstream bpp")
+    for row in sweep(initial):
+        actual = 8 * len(bitstream.encode(initial, scaled_table(row["quality"]))) / initial.size
+        print(f"{row['quality']:7d} {row['psnr']:7.2f} {row['bpp']:14.3f} {actual:14.3f}")
@@ -0,0 +1,141 @@
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import dct
+from . import entropy
+from . import utils
+from .psnr import psnr
+from .loader import load_image
+
+# Sequence mode for screen captures and fixed-camera stills: each frame is
+# compared block by block with the blocks last sent, unchanged blocks are
+# only flagged as skipped and the decoder keeps its previous pixels for
+# them. Changed blocks are coded intra, or as a residual against the
+# previous reconstructed frame.
+
+# skip: (H/8, W/8) bool, coefficients: (changed, 8, 8) int16 in raster
+# order of the changed blocks, residual: whether they code a difference.
+Frame = namedtuple("Frame", ["skip", "coefficients", "residual"])
+
+
+def changed_blocks(blocks : np.array, reference : np.array, threshold : int = 0):
+    # Exact comparison of whole blocks is as cheap as hashing them and has
+    # no collisions; a threshold also skips blocks with only sensor noise.
+    if threshold == 0:
+        return np.any(blocks != reference, axis=(2, 3))
+    difference = np.abs(blocks.astype(np.int16) - reference)
+    return difference.max(axis=(2, 3)) > threshold
+
+def frame_bytes(frame : Frame):
+    # Size of the frame as skip bitmap plus entropy coded changed blocks.
+    size = len(np.packbits(frame.skip))
+    if len(frame.coefficients):
+        tables, payload = entropy.encode(utils.from_blocks(frame.coefficients[None]))
+        size += len(tables) + len(payload)
+    return size
+
+
+class SequenceDecoder:
+
+    def __init__(self, shape, table : np.array = dct.quantization_table):
+        self.shape = shape
+        self.table = table
+        self.blocks = None
+
+    def decode(self, frame : Frame):
+        changed = ~frame.skip
+        if frame.residual:
+            delta = np.round(dct.idct(frame.coefficients * self.table))
+            self.blocks[changed] = np.clip(self.blocks[changed] + delta, 0, 255)
+        else:
+            if self.blocks is None:
+                self.blocks = np.zeros(frame.skip.shape + (utils.BLOCK_SIZE, utils.BLOCK_SIZE), dtype=np.int16)
+            self.blocks[changed] = dct.decompress_block(frame.coefficients, self.table)
+        return utils.crop(utils.from_blocks(self.blocks), self.shape)
+
+
+class SequenceEncoder:
+
+    def __init__(self, shape, table : np.array = dct.quantization_table, threshold : int = 0, residual : bool = False):
+        self.shape = shape
+        self.table = table
+        self.threshold = threshold
+        self.residual = residual
+        self.reference = None
+        # Residual coding predicts from what the decoder has, so the
+        # encoder runs a decoder of its own to stay in sync with it.
+        self.decoder = SequenceDecoder(shape, table) if residual else None
+        self.frames = 0
+        self.skipped = 0
+        self.total = 0
+
+    def encode(self, image : np.array) -> Frame:
+        blocks = utils.to_blocks(utils.pad_to_blocks(image))
+        if self.reference is None:
+            self.reference = blocks.copy()
+            changed = np.ones(blocks.shape[:2], dtype=bool)
+        else:
+            changed = changed_blocks(blocks, self.reference, self.threshold)
+            self.reference[changed] = blocks[changed]
+        residual = self.residual and self.frames > 0
+        if residual:
+            difference = blocks[changed] - self.decoder.blocks[changed]
+            coefficients = np.round(dct.dct(difference) / self.table).astype(np.int16)
+        else:
+            coefficients = dct.compress_block(blocks[changed], self.table).astype(np.int16)
+        frame = Frame(~changed, coefficients, residual)
+        if self.decoder is not None:
+            self.decoder.decode(frame)
+        self.frames += 1
+        self.skipped += int(changed.size - np.count_nonzero(changed))
+        self.total += changed.size
+        return frame
+
+    def skip_ratio(self):
+        return self.skipped / self.total if self.total else 0.0
+
+
+def screen_frames(image : np.array, count : int, size : int = 48, step : int = 5):
+    # Synthetic capture: a static background with a window dragged across
+    # it and a flickering status bar at the bottom.
+    window = np.full((size, 2 * size), 230, dtype=np.int16)
+    window[:8] = 40
+    for t in range(count):
+        frame = image.copy()
+        top = (t * step) % (image.shape[0] - size - 16)
+        left = (t * 2 * step) % (image.shape[1] - 2 * size)
+        frame[top:top + size, left:left + 2 * size] = window
+        frame[-16:, : 64 + (t % 8) * 16] = 255 - 16 * (t % 4)
+        yield frame
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    FRAMES = 60
+    initial = load_image(FILENAME)
+    frames = list(screen_frames(initial, FRAMES))
+    megabytes = initial.size * FRAMES / 1e6
+
+    start = time.perf_counter()
+    full = [dct.compress(frame) for frame in frames]
+    elapsed_full = time.perf_counter() - start
+    full_bytes = sum(len(tables) + len(payload) for tables, payload in map(entropy.encode, full))
+    print(f"Sequence of {FRAMES} frames of {FILENAME} {initial.shape}")
+    print(f"every frame:  {FRAMES / elapsed_full:8.1f} frames/s  {megabytes / elapsed_full:7.1f} MB/s  "
+          f"{full_bytes / FRAMES:9.0f} bytes/frame")
+
+    for residual in (False, True):
+        encoder = SequenceEncoder(initial.shape, residual=residual)
+        decoder = SequenceDecoder(initial.shape)
+        start = time.perf_counter()
+        encoded = [encoder.encode(frame) for frame in frames]
+        elapsed = time.perf_counter() - start
+        decoded = [decoder.decode(frame) for frame in encoded]
+        size = sum(frame_bytes(frame) for frame in encoded)
+        quality = min(psnr(frame, image) for frame, image in zip(frames, decoded))
+        name = "residual:" if residual else "skip blocks:"
+        print(f"{name:13s} {FRAMES / elapsed:7.1f} frames/s  {megabytes / elapsed:7.1f} MB/s  "
+              f"{size / FRAMES:9.0f} bytes/frame  skip ratio {encoder.skip_ratio():.3f}  min PSNR {quality:.2f}")
@@ -0,0 +1,164 @@
+import sys
+import time
+
+import numpy as np
+
+from . import instrument
+from .metrics import PEAK, _strips
+
+# SSIM (Wang et al. 2004) and MS-SSIM (Wang et al. 2003) in float32. Local
+# statistics come from separable filters over the valid region, an 11-tap
+# Gaussian (sigma 1.5) or a box filter built on cumulative sums whose cost
+# does not depend on the window size. With strip_rows the inputs, which may
+# be memory mapped, are read a strip of output rows at a time; MS-SSIM keeps
+# only the half-resolution copies in memory.
+
+WINDOW = 11
+SIGMA = 1.5
+K1 = 0.01
+K2 = 0.03
+MS_WEIGHTS = np.array([0.0448, 0.2856, 0.3001, 0.2363, 0.1333])
+CHUNK_ROWS = 32
+
+
+def gaussian_window(size : int = WINDOW, sigma : float = SIGMA):
+    x = np.arange(size) - (size - 1) / 2
+    window = np.exp(-x * x / (2 * sigma * sigma))
+    return (window / window.sum()).astype(np.float32)
+
+def taps(image : np.array, axis : int, start : int, n : int):
+    # image[..., start:start + n, :] (axis -2) or image[..., start:start + n].
+    index = [slice(None)] * image.ndim
+    index[axis] = slice(start, start + n)
+    return image[tuple(index)]
+
+def gaussian_filter(image : np.array, window : np.array):
+    # Valid correlation with window along the last two axes, one tap at a
+    # time into a single accumulator; slicing keeps rows contiguous.
+    size = len(window)
+    for axis in (-2, -1):
+        n = image.shape[axis] - size + 1
+        output = taps(image, axis, 0, n) * window[0]
+        scratch = np.empty_like(output)
+        for k in range(1, size):
+            output += np.multiply(taps(image, axis, k, n), window[k], out=scratch)
+        image = output
+    return image
+
+def box_filter(image : np.array, size : int = WINDOW):
+    # Window sums as differences of cumulative sums, taken in float64 so
+    # long rows do not lose precision; the cost is independent of size.
+    for axis in (-2, -1):
+        total = np.cumsum(image, axis=axis, dtype=np.float64)
+        n = image.shape[axis] - size + 1
+        sums = taps(total, axis, size - 1, n).copy()
+        taps(sums, axis, 1, n - 1)[...] -= taps(total, axis, 0, n - 1)
+        image = sums
+    return (image / (size * size)).astype(np.float32)
+
+def local_filter(window : str):
+    if window == "gaussian":
+        weights = gaussian_window()
+        return lambda image: gaussian_filter(image, weights)
+    if window == "box":
+        return box_filter
+    raise ValueError(f"Unknown window {window!r}, expected 'gaussian' or 'box'")
+
+def maps(x : np.array, y : np.array, filtered):
+    # Luminance and contrast-structure maps over the valid region; the five
+    # local statistics are filtered as one stacked array.
+    c1 = (K1 * PEAK) ** 2
+    c2 = (K2 * PEAK) ** 2
+    mu_x, mu_y, mu_xx, mu_yy, mu_xy = filtered(np.stack([x, y, x * x, y * y, x * y]))
+    sigma_xx = mu_xx - mu_x * mu_x
+    sigma_yy = mu_yy - mu_y * mu_y
+    sigma_xy = mu_xy - mu_x * mu_y
+    luminance = (2 * mu_x * mu_y + c1) / (mu_x * mu_x + mu_y * mu_y + c1)
+    contrast_structure = (2 * sigma_xy + c2) / (sigma_xx + sigma_yy + c2)
+    return luminance, contrast_structure
+
+def totals(image1 : np.array, image2 : np.array, strip_rows=None, window : str = "gaussian"):
+    # Sums of the SSIM and contrast-structure maps and their pixel count.
+    # Without strip_rows the work still goes in CHUNK_ROWS strips, which
+    # keeps the temporaries in cache.
+    if image1.shape != image2.shape:
+        raise ValueError(f"Shape mismatch: {image1.shape} and {image2.shape}")
+    filtered = local_filter(window)
+    n = image1.shape[0] - WINDOW + 1
+    ssim_sum = 0.0
+    cs_sum = 0.0
+    count = 0
+    if n <= 0 or image1.shape[1] < WINDOW:
+        return ssim_sum, cs_sum, count
+    for start, end in _strips(n, strip_rows or CHUNK_ROWS):
+        x = np.asarray(image1[start:end + WINDOW - 1], dtype=np.float32)
+        y = np.asarray(image2[start:end + WINDOW - 1], dtype=np.float32)
+        luminance, contrast_structure = maps(x, y, filtered)
+        cs_sum += float(contrast_structure.sum(dtype=np.float64))
+        ssim_sum += float(np.multiply(luminance, contrast_structure, out=luminance).sum(dtype=np.float64))
+        count += contrast_structure.size
+    return ssim_sum, cs_sum, count
+
+@instrument.timed("ssim")
+def ssim(image1 : np.array, image2 : np.array, strip_rows=None, window : str = "gaussian"):
+    # NaN for images smaller than the window.
+    ssim_sum, _, count = totals(image1, image2, strip_rows, window)
+    return ssim_sum / count if count else float("nan")
+
+def downsample(image : np.array, strip_rows=None):
+    # 2x2 averages in float32; an odd last row or column is dropped.
+    (n, m) = (image.shape[0] // 2, image.shape[1] // 2)
+    output = np.empty((n, m), dtype=np.float32)
+    rows = None if strip_rows is None else max(1, strip_rows // 2)
+    for start, end in _strips(n, rows):
+        strip = np.asarray(image[2 * start:2 * end, :2 * m], dtype=np.float32)
+        output[start:end] = strip.reshape(end - start, 2, m, 2).mean(axis=(1, 3))
+    return output
+
+@instrument.timed("ms_ssim")
+def ms_ssim(image1 : np.array, image2 : np.array, strip_rows=None, window : str = "gaussian",
+            weights : np.array = MS_WEIGHTS):
+    # Contrast-structure terms at the finer scales, full SSIM at the
+    # coarsest; NaN when the coarsest scale is smaller than the window.
+    if min(image1.shape) >> (len(weights) - 1) < WINDOW:
+        return float("nan")
+    value = 1.0
+    for scale, weight in enumerate(weights):
+        ssim_sum, cs_sum, count = totals(image1, image2, strip_rows, window)
+        last = scale == len(weights) - 1
+        value *= max(ssim_sum / count if last else cs_sum / count, 0.0) ** weight
+        if not last:
+            image1 = downsample(image1, strip_rows)
+            image2 = downsample(image2, strip_rows)
+    return value
+
+def ssim_batch(pairs, strip_rows=None, window : str = "gaussian"):
+    return [{"ssim": ssim(original, decoded, strip_rows, window),
+             "ms_ssim": ms_ssim(original, decoded, strip_rows, window)} for original, decoded in pairs]
+
+
+if __name__ == "__main__":
+    from . import dct
+    from . import utils
+    from .benchmark import generated_image
+    from .metrics import psnr
+    from .loader import load_image
+
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+    decoded = dct.decompress(dct.compress(initial), initial.shape)
+    print(f"SSIM of the DCT round trip of {FILENAME} {initial.shape}, PSNR {psnr(initial, decoded):.2f}")
+    for window in ("gaussian", "box"):
+        whole = ssim(initial, decoded, window=window)
+        streamed = ssim(initial, decoded, strip_rows=64, window=window)
+        print(f"{window:8s} SSIM {whole:.5f} (64-row strips {streamed:.5f})  MS-SSIM {ms_ssim(initial, decoded, window=window):.5f}")
+
+    large = generated_image(4096)
+    noisy = np.clip(large + np.random.default_rng(0).normal(0, 5, large.shape), 0, 255).astype(np.int16)
+    megapixels = large.size / 1e6
+    for name, function in [("PSNR", psnr), ("SSIM", ssim), ("SSIM box", lambda a, b: ssim(a, b, window="box")),
+                           ("MS-SSIM", ms_ssim), ("SSIM strips", lambda a, b: ssim(a, b, strip_rows=512))]:
+        start = time.perf_counter()
+        value = function(large, noisy)
+        elapsed = time.perf_counter() - start
+        print(f"{name:12s} {value:9.5f}  {megapixels / elapsed:7.1f} Mpixel/s")
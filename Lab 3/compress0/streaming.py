@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from . import dct
+from . import dwt_custom
+from . import utils
+from .loader import load_image, open_memmap
+
+# Number of 8-row block strips held in memory at once.
+STRIPS = 16
+CODECS = {"dct": dct, "dwt_custom": dwt_custom}
+
+
+def padded_shape(shape):
+    return shape[0] + (-shape[0] % utils.BLOCK_SIZE), shape[1] + (-shape[1] % utils.BLOCK_SIZE)
+
+def map_strips(source : np.array, destination_path : str, transform, out_shape, strips : int = STRIPS):
+    # Only `strips` block rows of the source and their transformed copy are
+    # alive at a time; results go straight into a memory mapped .npy file.
+    rows = strips * utils.BLOCK_SIZE
+    destination = None
+    for start in range(0, source.shape[0], rows):
+        result = transform(source[start:start + rows])
+        if destination is None:
+            destination = np.lib.format.open_memmap(destination_path, mode='w+', dtype=result.dtype, shape=out_shape)
+        end = min(start + result.shape[0], out_shape[0])
+        destination[start:end] = result[:end - start, :out_shape[1]]
+    destination.flush()
+    return destination
+
+def compress_file(source_path : str, destination_path : str, codec=dct, strips : int = STRIPS,
+                  shape=None, dtype=np.uint8):
+    source = open_memmap(source_path, shape, dtype)
+    return map_strips(source, destination_path, lambda strip: codec.compress(strip.astype(np.int16)),
+                      padded_shape(source.shape), strips)
+
+def decompress_file(source_path : str, destination_path : str, shape, codec=dct, strips : int = STRIPS):
+    source = open_memmap(source_path)
+    return map_strips(source, destination_path, codec.decompress, shape, strips)
+
+
+if __name__ == "__main__":
+    FILENAME = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    initial = load_image(FILENAME)
+    with tempfile.TemporaryDirectory() as work_dir:
+        raw_path = os.path.join(work_dir, "image.raw")
+        initial.astype(np.uint8).tofile(raw_path)
+        for name, codec in CODECS.items():
+            compressed_path = os.path.join(work_dir, name + "_c.npy")
+            decompressed_path = os.path.join(work_dir, name + "_d.npy")
+            tracemalloc.start()
+            compressed = compress_file(raw_path, compressed_path, codec, strips=2, shape=initial.shape)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            decompressed = decompress_file(compressed_path, decompressed_path, initial.shape, codec, strips=2)
+
+            in_memory = codec.compress(initial)
+            print(f"{name}: streamed output matches in-memory path: "
+                  f"compress {np.array_equal(compressed, in_memory)}, "
+                  f"decompress {np.array_equal(decompressed, codec.decompress(in_memory, initial.shape))}, "
+                  f"peak memory {peak / 1024:.0f} KiB for 2 strips")
+            del compressed, decompressed
@@ -0,0 +1,176 @@
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import bitstream
+from . import dct
+from . import entropy
+from . import utils
+from .psnr import psnr
+from .loader import load_image
+
+# Tiled DCT container: every tile is a separately entropy coded group of
+# 8x8 blocks, and an index of byte offsets after the header lets a reader
+# decode any rectangle from the tiles that intersect it.
+#
+#   header | quantization table (64 x u2) | offsets ((tiles + 1) x u8) | tiles
+#
+# Offsets are relative to the first tile; a tile is
+#   Huffman tables length (u2) | payload length (u4) | tables | payload
+
+MAGIC = b"DCTT"
+VERSION = 1
+TILE_SIZE = 256
+# magic, version, height, width, tile size
+HEADER = struct.Struct(">4sBIIH")
+TILE_HEADER = struct.Struct(">HI")
+
+
+def grid(shape, tile_size : int = TILE_SIZE):
+    return -(-shape[0] // tile_size), -(-shape[1] // tile_size)
+
+def tile_region(shape, tile_size : int, row : int, column : int):
+    top = row * tile_size
+    left = column * tile_size
+    return slice(top, min(top + tile_size, shape[0])), slice(left, min(left + tile_size, shape[1]))
+
+def encode(image : np.array, table : np.array = dct.quantization_table, tile_size : int = TILE_SIZE) -> bytes:
+    if tile_size % utils.BLOCK_SIZE:
+        raise ValueError(f"Tile size must be a multiple of {utils.BLOCK_SIZE}, got {tile_size}")
+    (rows, columns) = grid(image.shape, tile_size)
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            tile = image[tile_region(image.shape, tile_size, row, column)]
+            tables, payload = entropy.encode(dct.compress(tile, table))
+            tiles.append(TILE_HEADER.pack(len(tables), len(payload)) + tables + payload)
+    offsets = np.cumsum([0] + [len(tile) for tile in tiles]).astype('>u8')
+    header = HEADER.pack(MAGIC, VERSION, image.shape[0], image.shape[1], tile_size)
+    return header + np.asarray(table).astype('>u2').tobytes() + offsets.tobytes() + b"".join(tiles)
+
+def write(file_path : str, image : np.array, table : np.array = dct.quantization_table, tile_size : int = TILE_SIZE):
+    data = encode(image, table, tile_size)
+    with open(file_path, "wb") as file:
+        file.write(data)
+    return len(data)
+
+
+class TiledImage:
+    # Read-only view of a tiled file through mmap; only the index is parsed
+    # up front, tile bytes are paged in when a tile is decoded.
+
+    def __init__(self, file_path : str):
+        self.path = file_path
+        with open(file_path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, height, width, tile_size = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError("Not a tiled DCT bitstream")
+        if version != VERSION:
+            raise ValueError(f"Unsupported bitstream version {version}")
+        self.shape = (height, width)
+        self.tile_size = tile_size
+        self.grid = grid(self.shape, tile_size)
+        offset = HEADER.size
+        self.table = np.frombuffer(self.data, dtype='>u2', count=64, offset=offset).reshape(8, 8).astype(np.int64)
+        offset += 128
+        count = self.grid[0] * self.grid[1] + 1
+        self.offsets = np.frombuffer(self.data, dtype='>u8', count=count, offset=offset).astype(np.int64)
+        self.start = offset + 8 * count
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def decode_tile(self, row : int, column : int):
+        index = row * self.grid[1] + column
+        offset = self.start + self.offsets[index]
+        tables_length, payload_length = TILE_HEADER.unpack_from(self.data, offset)
+        offset += TILE_HEADER.size
+        tables = self.data[offset:offset + tables_length]
+        offset += tables_length
+        payload = self.data[offset:offset + payload_length]
+        (rows, columns) = tile_region(self.shape, self.tile_size, row, column)
+        shape = (rows.stop - rows.start, columns.stop - columns.start)
+        padded_shape = (shape[0] + (-shape[0] % 8), shape[1] + (-shape[1] % 8))
+        coefficients = entropy.decode(tables, payload, padded_shape)
+        return dct.decompress(coefficients, shape, self.table)
+
+    def decode_region(self, top : int, left : int, height : int, width : int):
+        # Only tiles that intersect the rectangle are read and decoded.
+        bottom = min(top + height, self.shape[0])
+        right = min(left + width, self.shape[1])
+        output = np.empty((bottom - top, right - left), dtype=np.int16)
+        size = self.tile_size
+        for row in range(top // size, -(-bottom // size)):
+            for column in range(left // size, -(-right // size)):
+                tile = self.decode_tile(row, column)
+                y0 = max(top, row * size)
+                x0 = max(left, column * size)
+                y1 = min(bottom, (row + 1) * size)
+                x1 = min(right, (column + 1) * size)
+                output[y0 - top:y1 - top, x0 - left:x1 - left] = tile[y0 - row * size:y1 - row * size,
+                                                                      x0 - column * size:x1 - column * size]
+        return output
+
+    def decode(self, workers=1):
+        if workers == 1:
+            return self.decode_region(0, 0, *self.shape)
+        output = np.empty(self.shape, dtype=np.int16)
+        rows = range(self.grid[0])
+        # Each worker maps the file itself, so only tile rows' pixels cross
+        # the process boundary.
+        with ProcessPoolExecutor(workers) as pool:
+            for row, strip in zip(rows, pool.map(decode_row, [self.path] * len(rows), rows)):
+                output[tile_region(self.shape, self.tile_size, row, 0)[0]] = strip
+        return output
+
+def decode_row(file_path : str, row : int):
+    with TiledImage(file_path) as tiled:
+        size = tiled.tile_size
+        return tiled.decode_region(row * size, 0, size, tiled.shape[1])
+
+def read(file_path : str, workers=1):
+    with TiledImage(file_path) as tiled:
+        return tiled.decode(workers)
+
+
+if __name__ == "__main__":
+    input_path = sys.argv[1] if len(sys.argv) > 1 else utils.package_path("input", "lena.png")
+    output_path = sys.argv[2] if len(sys.argv) > 2 else utils.package_path("dct", input_path.split("/")[-1].split(".")[0] + ".dctt")
+    initial = load_image(input_path)
+    # Repeat the image into a larger mosaic so tiling has something to skip.
+    mosaic = np.tile(initial, (4, 4))
+    size = write(output_path, mosaic, tile_size=TILE_SIZE)
+    untiled = len(bitstream.encode(mosaic))
+    reference = dct.decompress(dct.compress(mosaic), mosaic.shape)
+
+    with TiledImage(output_path) as tiled:
+        start = time.perf_counter()
+        crop = tiled.decode_region(1000, 700, 128, 200)
+        cropped = time.perf_counter()
+        full = tiled.decode()
+        decoded = time.perf_counter()
+    workers = os.cpu_count()
+    start_parallel = time.perf_counter()
+    parallel = read(output_path, workers)
+    finished = time.perf_counter()
+    os.remove(output_path)
+
+    print(f"Tiled bitstream for {input_path} tiled 4x4 {mosaic.shape}, {TILE_SIZE}px tiles")
+    print(f"size: {size} bytes, untiled {untiled} bytes (+{100 * (size / untiled - 1):.2f}%)")
+    print(f"crop 128x200: {1000 * (cropped - start):8.2f} ms  full decode: {1000 * (decoded - cropped):8.2f} ms  "
+          f"{workers} processes: {1000 * (finished - start_parallel):8.2f} ms")
+    print(f"matches untiled decode: crop {np.array_equal(crop, reference[1000:1128, 700:900])}, "
+          f"full {np.array_equal(full, reference)}, parallel {np.array_equal(parallel, reference)}")
+    print(f"PSNR: {psnr(mosaic, full)}")
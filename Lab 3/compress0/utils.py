@@ -1,9 +1,77 @@
+import os
+
 import numpy as np
+
+from . import instrument
+
+BLOCK_SIZE = 8
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def package_path(*parts):
+    # Sample inputs and demo outputs live next to the modules.
+    return os.path.join(PACKAGE_DIR, *parts)
+
+@instrument.timed("scale_matrix")
 def scale_matrix(matrix):
     min_val = np.min(matrix)
     max_val = np.max(matrix)
 
-    scaled_matrix = 255 * (matrix - min_val) / (max_val - min_val)
-    scaled_matrix = np.round(scaled_matrix).astype(int)
+    scaled_matrix = matrix - min_val
+    scaled_matrix *= 255
+    scaled_matrix = scaled_matrix / (max_val - min_val)
+    np.round(scaled_matrix, out=scaled_matrix)
+
+    return scaled_matrix.astype(int)
+
+def pad_to_blocks(matrix : np.array, size : int = BLOCK_SIZE, out : np.array = None):
+    # With `out` the edge padding is written into that buffer instead of a
+    # new array; input that needs no padding is returned as is either way.
+    (n, m) = matrix.shape
+    pad_n = -n % size
+    pad_m = -m % size
+    if pad_n == 0 and pad_m == 0:
+        return matrix
+    if out is None:
+        return np.pad(matrix, ((0, pad_n), (0, pad_m)), mode='edge')
+    out[:n, :m] = matrix
+    out[n:, :m] = matrix[n - 1]
+    out[:, m:] = out[:, m - 1:m]
+    return out
+
+def to_blocks(matrix : np.array, size : int = BLOCK_SIZE):
+    (n, m) = matrix.shape
+    return matrix.reshape(n // size, size, m // size, size).swapaxes(1, 2)
+
+def from_blocks(blocks : np.array):
+    (h, w, n, m) = blocks.shape
+    return blocks.swapaxes(1, 2).reshape(h * n, w * m)
+
+def crop(matrix : np.array, shape):
+    if shape is None:
+        return matrix
+    return matrix[:shape[0], :shape[1]]
+
+
+class Workspace:
+    # Preallocated buffers for one image shape, passed to the codecs as
+    # `workspace=` so that repeated calls on same-sized images allocate no
+    # full-image temporaries. Results returned from a call that used a
+    # workspace live in its buffers and are overwritten by the next call.
+
+    def __init__(self, shape, dtype=np.float64, size : int = BLOCK_SIZE):
+        self.shape = tuple(shape)
+        self.padded_shape = (shape[0] + (-shape[0] % size), shape[1] + (-shape[1] % size))
+        block_shape = (self.padded_shape[0] // size, self.padded_shape[1] // size, size, size)
+        self.pixels = np.empty(self.padded_shape, dtype=np.int16)
+        self.coefficients = np.empty(self.padded_shape, dtype=np.int16)
+        self.plane = np.empty(self.padded_shape, dtype=dtype)
+        self.blocks = np.empty(block_shape, dtype=dtype)
+        self.scratch = np.empty(block_shape, dtype=dtype)
+
+    def check(self, shape):
+        if tuple(shape) not in (self.shape, self.padded_shape):
+            raise ValueError(f"Workspace is for {self.shape}, got {tuple(shape)}")
 
-    return scaled_matrix
\ No newline at end of file
+    def plane_view(self, buffer : np.array, shape):
+        # `shape`-sized window of a buffer, read as one padded plane.
+        return buffer.reshape(self.padded_shape)[:shape[0], :shape[1]]